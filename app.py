@@ -1,24 +1,26 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 import os
+import json
+from datetime import datetime
 from functools import wraps
 from dotenv import load_dotenv
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_cors import CORS
-import pandas as pd
 import io
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+import hmac
+import math
+import click
+import multiprocessing
+import logging
 
 
-# Ensure firebase_config is imported to initialize Firebase once
-import firebase_config            # calls initialize_app(), provides firestore_db
-from firebase_admin import auth as firebase_auth
+# Heavy subsystems (pandas, statsmodels, matplotlib, yfinance, Firebase,
+# TensorFlow) are imported on first use; see services/preload.py.
 from db_config import DB_CONFIG as DB_URI
 
 
 from model import db, ma, bcrypt
-from model.user import User
 from model.transaction import Transaction, transaction_schema, transactions_schema
 from model.trigger import Trigger
 from model.wallet import WalletBalance
@@ -28,17 +30,52 @@ from model.rating import Rating
 
 from services.exchange_api import (
     get_live_rates,
-    get_historical_rates,
     get_margin_info,
-    get_historical_rates_df
+    rate_cache_stats
 )
-from services.gold_api import get_gold_price, get_historical_gold_prices
-from services.prediction import forecast_rates_hw
-from services.firestore_sync import sync_transaction_to_firestore
+from services.gold_api import get_gold_price, get_historical_gold_prices, start_gold_refresh
+from services.http_client import upstream_stats, upstream_metrics
+from services.bulk_ingest import (
+    parse_rows, validate_rows, insert_transactions, BulkPayloadError, MAX_ROWS as BULK_MAX_ROWS
+)
+from services.export import stream_export, TABLES as EXPORT_TABLES, FORMATS as EXPORT_FORMATS
+from services.candles import (
+    candles_enabled, record_trades, transaction_trade, get_candles, backfill_candles, INTERVALS as CANDLE_INTERVALS
+)
+from services.dashboard import dashboard_rates as build_dashboard, parse_pairs, configured_extra_pairs
+from services.rate_stream import broadcaster, event_stream, publish_alerts, TooManySubscribers
+from services.prediction import (
+    forecast_rates_hw,
+    forecast_many,
+    forecast_cache_stats,
+    trade_suggestion,
+    MAX_BATCH_PAIRS
+)
+from services.rate_store import get_history_df, get_history_rates
+from services.rate_scheduler import start_rate_ingestion, ingest_hooks
+from services.charts import get_forecast_chart, prerender_charts, chart_cache_stats
+from services.firestore_sync import enqueue_transaction, start_outbox_worker
+from services.auth_cache import verify_token, resolve_user, auth_cache_stats
+from services.matching_engine import matching_engine, BookConflict
+from services.ledger import credit, debit, balance_of, release_escrows, InsufficientFunds
+from services.trigger_engine import evaluate_triggers, alert_hooks, OPERATORS
+from utils.geoip import build_database as build_geoip, DB_PATH as GEOIP_DB_PATH
+from utils.pagination import encode_cursor, decode_cursor, keyset_after, page_limit
+from services.rate_buckets import (
+    buckets_enabled,
+    record_transaction,
+    window_totals,
+    rebuild_buckets
+)
+from services.trigger_index import trigger_index
+from services.preload import preload
+from services import metrics
 
 # -------------------------- Load Environment --------------------------
 
 from db_config import DB_CONFIG
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 SECRET_KEY = "default_secret_key"         # or hard‑code your secret here
 
 
@@ -56,6 +93,7 @@ bcrypt.init_app(app)
 limiter = Limiter(get_remote_address)
 limiter.init_app(app)
 CORS(app)
+metrics.init_app(app)
 
 # -------------------------- Auth Decorator --------------------------
 def firebase_token_required(f):
@@ -66,16 +104,12 @@ def firebase_token_required(f):
             return jsonify({'error':'Missing token'}), 403
         token = hdr.split()[1]
         try:
-            decoded = firebase_auth.verify_id_token(token)
+            decoded = verify_token(token)
         except Exception as e:
             return jsonify({'error': str(e)}), 403
 
-        user = User.query.filter_by(firebase_uid=decoded['uid']).first()
-        if not user:
-            user = User(firebase_uid=decoded['uid'], email=decoded.get('email'))
-            db.session.add(user)
-            db.session.commit()
-
+        # repeat callers are answered from the token and uid caches
+        user = resolve_user(decoded)
         return f(user, *args, **kwargs)
     return decorated
 
@@ -98,16 +132,87 @@ def add_transaction(current_user):
         user_id=current_user.id
     )
     db.session.add(txn)
+    db.session.flush()                    # fills id and added_date
+    if buckets_enabled():
+        record_transaction(txn)
+    if candles_enabled():
+        record_trades([transaction_trade(txn)])
+    # synced to Firestore by the outbox worker, committed atomically with the trade
+    enqueue_transaction(txn)
     db.session.commit()
-    sync_transaction_to_firestore(txn)
     return jsonify(transaction_schema.dump(txn)), 201
 
+@app.route('/transactions/bulk', methods=['POST'])
+@limiter.limit('10 per minute')
+@firebase_token_required
+def add_transactions_bulk(current_user):
+    # JSON array or NDJSON (one transaction per line), all for the caller
+    try:
+        rows = parse_rows(request.get_data(), request.content_type or '')
+    except BulkPayloadError as e:
+        return jsonify({'error': str(e)}), 400
+    except UnicodeDecodeError:
+        return jsonify({'error': 'Body must be UTF-8'}), 400
+    if not rows:
+        return jsonify({'error': 'No transactions given'}), 400
+    if len(rows) > BULK_MAX_ROWS:
+        return jsonify({'error': f'At most {BULK_MAX_ROWS} transactions per request'}), 413
+
+    valid, errors = validate_rows(rows)
+    inserted, db_errors = insert_transactions(valid, current_user.id)
+    errors = sorted(errors + db_errors, key=lambda e: e['row'])
+    return jsonify({
+        'received': len(rows),
+        'inserted': inserted,
+        'failed':   len(errors),
+        'errors':   errors
+    }), 201 if inserted else 400
+
 @app.route('/transactions', methods=['GET'])
 @limiter.limit('5 per minute')
 @firebase_token_required
 def get_user_transactions(current_user):
-    txns = Transaction.query.filter_by(user_id=current_user.id).all()
-    return jsonify(transactions_schema.dump(txns)), 200
+    args = request.args
+    ndjson = args.get('format') == 'ndjson' or \
+             request.accept_mimetypes.best == 'application/x-ndjson'
+    if not ndjson and 'limit' not in args and 'cursor' not in args:
+        txns = Transaction.query.filter_by(user_id=current_user.id).all()
+        return jsonify(transactions_schema.dump(txns)), 200
+
+    # Keyset pagination, newest first, on (added_date, id)
+    q = Transaction.query.filter_by(user_id=current_user.id)
+    if args.get('cursor'):
+        try:
+            added, tid = decode_cursor(args['cursor'])
+            q = q.filter(keyset_after(
+                [Transaction.added_date, Transaction.id],
+                [datetime.fromisoformat(added), int(tid)],
+                descending=True
+            ))
+        except (ValueError, TypeError):
+            return jsonify({'error':'Invalid cursor'}), 400
+    q = q.order_by(Transaction.added_date.desc(), Transaction.id.desc())
+
+    if ndjson:
+        # rows are serialized as the DB cursor yields them: constant memory
+        def generate():
+            for t in q.yield_per(500):
+                yield json.dumps(transaction_schema.dump(t)) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    try:
+        limit = page_limit(args.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    txns = q.limit(limit + 1).all()
+    page = txns[:limit]
+    next_cursor = None
+    if len(txns) > limit:
+        next_cursor = encode_cursor(page[-1].added_date, page[-1].id)
+    return jsonify({
+        'data':        transactions_schema.dump(page),
+        'next_cursor': next_cursor
+    }), 200
 
 @app.route('/latest', methods=['GET'])
 @firebase_token_required
@@ -121,22 +226,42 @@ def get_latest_transaction(current_user):
 # -------------------------- Feature 1 & 2: Rates & Predictions --------------------------
 @app.route('/exchangeRate', methods=['GET'])
 def get_exchange_rate():
-    from datetime import datetime, timedelta
-    end   = datetime.utcnow()
-    start = end - timedelta(hours=72)
-    txns  = Transaction.query.filter(
-                Transaction.added_date.between(start,end),
-                Transaction.usd_to_lbp.is_(True)
-            ).all()
-    if not txns:
+    count, total_usd, total_lbp = window_totals(hours=72, usd_to_lbp=True)
+    if not count:
         return jsonify({'error':'No transactions'}), 404
-    total_usd = sum(t.usd_amount for t in txns)
-    total_lbp = sum(t.lbp_amount for t in txns)
     if total_usd == 0:
         return jsonify({'error':'Invalid txn data'}), 400
     rate = total_lbp / total_usd
     return jsonify({'usd_to_lbp': rate, 'lbp_to_usd': 1/rate}), 200
 
+@app.route('/api/candles', methods=['GET'])
+def candles():
+    pair     = request.args.get('pair', 'USDLBP').upper().replace('/', '')
+    interval = request.args.get('interval', '1h')
+    if interval not in CANDLE_INTERVALS:
+        return jsonify({'error': f"interval must be one of {', '.join(CANDLE_INTERVALS)}"}), 400
+    try:
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end   = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+        limit = page_limit(request.args.get('limit'), default=500, maximum=5000)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # precomputed buckets: cost grows with the candles returned, not the trades
+    rows = get_candles(pair, interval, start, end, limit)
+    return jsonify({
+        'pair':     pair,
+        'interval': interval,
+        'candles':  [{
+            'time':   c.bucket_start.isoformat(),
+            'open':   c.open,
+            'high':   c.high,
+            'low':    c.low,
+            'close':  c.close,
+            'volume': c.volume,
+            'trades': c.trade_count
+        } for c in rows]
+    }), 200
+
 @app.route('/api/live-rates')
 def live_rates():
     try:
@@ -144,6 +269,16 @@ def live_rates():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/rate-cache/stats')
+@metrics.api_key_required
+def rate_cache_stats_route():
+    return jsonify(rate_cache_stats()), 200
+
+@app.route('/api/upstreams/stats')
+@metrics.api_key_required
+def upstream_stats_route():
+    return jsonify(upstream_stats()), 200
+
 @app.route('/api/gold-price')
 def gold_price():
     try:
@@ -161,17 +296,33 @@ def historical_gold():
 
 @app.route('/api/dashboard-rates')
 def dashboard_rates():
+    # live rates, gold and extra pairs are fetched concurrently; a slow or
+    # failing source only marks the response as partial
+    extra = configured_extra_pairs()
+    extra += [p for p in parse_pairs(request.args.get('pairs')) if p not in extra]
+    data = build_dashboard(extra)
+    if data['currency_rates'] is None and data['gold_price'] is None:
+        return jsonify({'error': '; '.join(data['errors'].values())}), 500
+    return jsonify(data)
+
+@app.route('/api/stream/rates')
+def stream_rates():
+    # one shared producer polls rates/gold/triggers for every subscriber;
+    # clients get a snapshot, then only the quotes that changed
     try:
-        ex = get_live_rates()
-        gd = get_gold_price()
-        return jsonify({
-            'currency_rates': ex['quotes'],
-            'base_currency':  ex['source'],
-            'gold_price':     gd
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-    
+        sub = broadcaster.subscribe(app)
+    except TooManySubscribers as e:
+        return jsonify({'error': str(e)}), 503
+    resp = Response(stream_with_context(event_stream(sub)), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
+@app.route('/api/stream/stats')
+@metrics.api_key_required
+def stream_stats():
+    return jsonify(broadcaster.stats()), 200
+
 @app.route('/api/margin/<currency>')
 @firebase_token_required    # or remove this decorator if you want it public
 def show_margin(current_user, currency):
@@ -192,7 +343,7 @@ def show_margin(current_user, currency):
 def historical_currency(currency):
     days = int(request.args.get('days', 7))
     try:
-        return jsonify(get_historical_rates(
+        return jsonify(get_history_rates(
             source='USD', currency=currency.upper(), days=days
         ))
     except Exception as e:
@@ -203,43 +354,126 @@ def historical_df():
     src  = request.args.get('source', 'USD').upper()
     cur  = request.args.get('currency', 'EUR').upper()
     days = int(request.args.get('days', 7))
-    df   = get_historical_rates_df(source=src, currency=cur, days=days)
+    df   = get_history_df(source=src, currency=cur, days=days)
     df['date'] = df['date'].dt.strftime('%Y-%m-%d')
     return jsonify({'status':'success','data': df.to_dict('records')}), 200
 
 @app.route('/predict-df')
 def predict_df():
+    import pandas as pd
     src = request.args.get('source', 'USD').upper()
     cur = request.args.get('currency', 'EUR').upper()
     h   = int(request.args.get('history_days', 30))
     f   = int(request.args.get('forecast_days', 7))
-    dfh = get_historical_rates_df(src, cur, h)
+    dfh = get_history_df(src, cur, h)
     last= dfh['rate'].iloc[-1]
-    dfp = forecast_rates_hw(src, cur, h, f)
-    first = dfp['yhat'].iloc[0]
-    suggestion = 'BUY' if first > last else 'SELL' if first < last else 'HOLD'
+    dfp = forecast_rates_hw(src, cur, h, f, history=dfh)
+    suggestion = trade_suggestion(last, dfp['yhat'].iloc[0])
     dfp['date'] = pd.to_datetime(dfp['date']).dt.strftime('%Y-%m-%d')
     return jsonify({'status':'success','suggestion':suggestion,'data':dfp.to_dict('records')}), 200
 
+@app.route('/predict-batch', methods=['POST'])
+def predict_batch():
+    d = request.get_json() or {}
+    h = int(d.get('history_days', 30))
+    f = int(d.get('forecast_days', 7))
+    pairs = []
+    for p in d.get('pairs') or []:
+        if isinstance(p, str) and ':' in p:
+            src, cur = p.split(':', 1)
+        elif isinstance(p, dict) and p.get('currency'):
+            src, cur = p.get('source', 'USD'), p['currency']
+        else:
+            return jsonify({'error': 'Each pair needs a currency'}), 400
+        pairs.append((src.upper(), cur.upper()))
+    if not pairs:
+        return jsonify({'error': 'No pairs given'}), 400
+    if len(pairs) > MAX_BATCH_PAIRS:
+        return jsonify({'error': f'At most {MAX_BATCH_PAIRS} pairs per request'}), 400
+    results, errors = forecast_many(pairs, h, f)
+    return jsonify({'status':'success','results': results,'errors': errors}), 200
+
+@app.route('/api/forecast-cache/stats')
+@metrics.api_key_required
+def forecast_cache_stats_route():
+    return jsonify(forecast_cache_stats()), 200
+
 @app.route('/predict-plot')
 def predict_plot():
     src = request.args.get('source', 'USD').upper()
     cur = request.args.get('currency', 'EUR').upper()
     h   = int(request.args.get('history_days', 30))
     f   = int(request.args.get('forecast_days', 7))
-    dfh = get_historical_rates_df(src, cur, h)
-    dfp = forecast_rates_hw(src, cur, h, f)
-    dfp['date'] = pd.to_datetime(dfp['date'])
-    fig, ax = plt.subplots(figsize=(10, 5))
-    ax.plot(dfh['date'], dfh['rate'], label='Historical')
-    ax.plot(dfp['date'], dfp['yhat'], linestyle='--', marker='x', label='Forecast')
-    ax.set_title(f'{src} → {cur} Forecast')
-    ax.set_xlabel('Date'); ax.set_ylabel('Rate')
-    ax.legend()
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    fig.autofmt_xdate()
-    buf = io.BytesIO(); plt.savefig(buf, format='png'); buf.seek(0); plt.close(fig)
-    return send_file(buf, mimetype='image/png')
+    png, etag = get_forecast_chart(src, cur, h, f)
+    # send_file answers If-None-Match with a 304 when the ETag still matches
+    return send_file(io.BytesIO(png), mimetype='image/png', etag=etag,
+                     max_age=int(os.getenv('CHART_MAX_AGE', 300)))
+
+@app.route('/api/chart-cache/stats')
+@metrics.api_key_required
+def chart_cache_stats_route():
+    return jsonify(chart_cache_stats()), 200
+
+# -------------------------- Analytics Export --------------------------
+@app.route('/api/export/<table>', methods=['GET'])
+def export_table(table):
+    key = os.getenv('EXPORT_API_KEY')
+    if not key:
+        return jsonify({'error':'Export is disabled'}), 403
+    if not hmac.compare_digest(request.headers.get('X-API-Key', ''), key):
+        return jsonify({'error':'Invalid API key'}), 403
+    if table not in EXPORT_TABLES:
+        return jsonify({'error': f"Unknown table, expected one of {', '.join(EXPORT_TABLES)}"}), 404
+
+    fmt = request.args.get('format', 'parquet').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    mimetype, ext, needs_arrow = EXPORT_FORMATS[fmt]
+    if needs_arrow:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return jsonify({'error': f'{fmt} export needs pyarrow installed'}), 501
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d') if request.args.get('start') else None
+        end   = datetime.strptime(request.args['end'], '%Y-%m-%d') if request.args.get('end') else None
+        user_id = int(request.args['user_id']) if request.args.get('user_id') else None
+    except ValueError:
+        return jsonify({'error':'start/end must be YYYY-MM-DD and user_id an integer'}), 400
+    if table == 'rates':
+        if user_id is not None:
+            return jsonify({'error':'rates have no user_id'}), 400
+        start, end = start and start.date(), end and end.date()
+
+    # rows go from a server-side cursor to the client one chunk at a time
+    chunks = (c for c in stream_export(table, fmt, start, end, user_id) if c)
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={table}.{ext}'
+    })
+
+# -------------------------- Metrics --------------------------
+metrics.register_cache('rate', rate_cache_stats)
+metrics.register_cache('forecast', lambda: forecast_cache_stats()['forecasts'])
+metrics.register_cache('forecast_params', lambda: forecast_cache_stats()['params'])
+metrics.register_cache('chart', chart_cache_stats)
+metrics.register_cache('auth_token', lambda: auth_cache_stats()['tokens'])
+metrics.register_cache('auth_user', lambda: auth_cache_stats()['users'])
+metrics.register_collector(upstream_metrics)
+
+@metrics.register_collector
+def rate_stream_metrics():
+    stats = broadcaster.stats()
+    return ['# HELP rate_stream_subscribers Connected /api/stream/rates clients',
+            '# TYPE rate_stream_subscribers gauge',
+            f"rate_stream_subscribers {stats['subscribers']}",
+            '# HELP rate_stream_dropped_total Stream clients dropped as slow consumers',
+            '# TYPE rate_stream_dropped_total counter',
+            f"rate_stream_dropped_total {stats['dropped']}"]
+
+@app.route('/metrics')
+@metrics.api_key_required
+def metrics_route():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
 
 # -------------------------- Feature 8: Triggers --------------------------
 @app.route('/check-triggers', methods=['POST'])
@@ -254,7 +488,7 @@ def create_trigger(current_user):
     )
     if not all([bc, tc, op, th]):
         return jsonify({'error':'Missing fields'}), 400
-    if op not in ['>', '<', '>=', '<=', '==']:
+    if op not in OPERATORS:
         return jsonify({'error':'Invalid operator'}), 400
     try:
         th = float(th)
@@ -269,28 +503,12 @@ def create_trigger(current_user):
     )
     db.session.add(trig)
     db.session.commit()
+    trigger_index.add(trig)
     return jsonify({'id':trig.id}), 201
 
 @app.route('/check-live-triggers', methods=['POST'])
 def check_live_triggers():
-    alerts = []
-    for t in Trigger.query.filter_by(triggered=False).all():
-        try:
-            data = get_live_rates(source=t.base_currency, currencies=[t.target_currency])
-            rate = data['quotes'][t.base_currency + t.target_currency]
-            if eval(f"{rate}{t.operator}{t.threshold}"):
-                t.triggered = True
-                db.session.commit()
-                alerts.append({
-                    'id': t.id,
-                    'base_currency': t.base_currency,
-                    'target_currency': t.target_currency,
-                    'operator': t.operator,
-                    'threshold': t.threshold,
-                    'live_rate': rate
-                })
-        except:
-            pass
+    alerts = evaluate_triggers()
     return jsonify({'triggered_alerts': alerts}), 200
 
 # -------------------------- Feature 7: P2P Exchange --------------------------
@@ -298,7 +516,7 @@ def check_live_triggers():
 @firebase_token_required
 def get_wallet(current_user):
     ws = WalletBalance.query.filter_by(user_id=current_user.id).all()
-    return jsonify([{'currency':w.currency,'balance':w.balance} for w in ws]), 200
+    return jsonify([{'currency':w.currency,'balance':float(w.balance)} for w in ws]), 200
 
 @app.route('/api/wallet/deposit', methods=['POST'])
 @firebase_token_required
@@ -308,18 +526,12 @@ def deposit(current_user):
     amt = float(d.get('amount', 0))
     if amt <= 0 or not cur:
         return jsonify({'error':'Invalid input'}), 400
-    w = WalletBalance.query.filter_by(user_id=current_user.id, currency=cur).first()
-    if not w:
-        w = WalletBalance(user_id=current_user.id, currency=cur, balance=0)
-        db.session.add(w)
-    w.balance += amt
+    credit(current_user.id, cur, amt, 'DEPOSIT')
     db.session.commit()
-    return jsonify({'currency': w.currency, 'balance': w.balance}), 200
+    return jsonify({'currency': cur, 'balance': float(balance_of(current_user.id, cur))}), 200
 
-@app.route('/api/orders', methods=['GET'])
-def list_orders():
-    os = Order.query.filter_by(status='OPEN').all()
-    return jsonify([{
+def _order_dict(o):
+    return {
         'id': o.id,
         'user_id': o.user_id,
         'type': o.type,
@@ -327,23 +539,126 @@ def list_orders():
         'target_currency': o.target_currency,
         'amount': o.amount,
         'price': o.price
-    } for o in os]), 200
+    }
+
+@app.route('/api/orders', methods=['GET'])
+def list_orders():
+    args = request.args
+    q = Order.query.filter_by(status='OPEN')
+    try:
+        if args.get('base'):
+            q = q.filter(Order.base_currency == args['base'].upper())
+        if args.get('target'):
+            q = q.filter(Order.target_currency == args['target'].upper())
+        side = args.get('side', '').upper()
+        if side:
+            if side not in ('BUY', 'SELL'):
+                return jsonify({'error':'side must be BUY or SELL'}), 400
+            q = q.filter(Order.type == side)
+        if args.get('min_price'):
+            q = q.filter(Order.price >= float(args['min_price']))
+        if args.get('max_price'):
+            q = q.filter(Order.price <= float(args['max_price']))
+        if args.get('min_amount'):
+            q = q.filter(Order.amount >= float(args['min_amount']))
+    except ValueError:
+        return jsonify({'error':'Price and amount filters must be numbers'}), 400
+
+    if 'limit' not in args and 'cursor' not in args:
+        return jsonify([_order_dict(o) for o in q.all()]), 200
+
+    # Keyset pages on (price, id): best bids first, cheapest asks first, and
+    # oldest first within a price level (time priority, as in the matching engine)
+    descending = side == 'BUY'
+    if args.get('cursor'):
+        try:
+            price, oid = decode_cursor(args['cursor'])
+            q = q.filter(keyset_after([Order.price, Order.id],
+                                      [float(price), int(oid)], [descending, False]))
+        except (ValueError, TypeError):
+            return jsonify({'error':'Invalid cursor'}), 400
+    if descending:
+        q = q.order_by(Order.price.desc(), Order.id)
+    else:
+        q = q.order_by(Order.price, Order.id)
+    try:
+        limit = page_limit(args.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = q.limit(limit + 1).all()
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1].price, page[-1].id) if len(rows) > limit else None
+    return jsonify({'data': [_order_dict(o) for o in page], 'next_cursor': next_cursor}), 200
+
+@app.route('/api/orders/depth', methods=['GET'])
+def order_book_depth():
+    base   = request.args.get('base', '').upper()
+    target = request.args.get('target', '').upper()
+    if not base or not target:
+        return jsonify({'error':'base and target are required'}), 400
+    try:
+        levels = page_limit(request.args.get('levels'), default=20, maximum=200)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def side_levels(side, best_first):
+        rows = db.session.query(
+            Order.price,
+            db.func.sum(Order.amount),
+            db.func.count(Order.id)
+        ).filter(
+            Order.status == 'OPEN',
+            Order.base_currency == base,
+            Order.target_currency == target,
+            Order.type == side
+        ).group_by(Order.price).order_by(best_first).limit(levels).all()
+        return [{'price': p, 'amount': a, 'orders': n} for p, a, n in rows]
+
+    return jsonify({
+        'base_currency':   base,
+        'target_currency': target,
+        'bids': side_levels('BUY', Order.price.desc()),
+        'asks': side_levels('SELL', Order.price.asc())
+    }), 200
 
 @app.route('/api/orders', methods=['POST'])
 @firebase_token_required
 def create_order(current_user):
     d = request.get_json() or {}
+    side = str(d.get('type', '')).upper()
+    base, target = str(d.get('base', '')).upper(), str(d.get('target', '')).upper()
+    if side not in ('BUY', 'SELL'):
+        return jsonify({'error':'type must be BUY or SELL'}), 400
+    if not base or not target:
+        return jsonify({'error':'Missing base or target currency'}), 400
+    try:
+        amount, price = float(d['amount']), float(d['price'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error':'amount and price must be numbers'}), 400
+    # the book and the depth view assume positive, finite quantities
+    if not (math.isfinite(amount) and math.isfinite(price) and amount > 0 and price > 0):
+        return jsonify({'error':'amount and price must be positive'}), 400
     o = Order(
         user_id=current_user.id,
-        type=d['type'],
-        base_currency=d['base'],
-        target_currency=d['target'],
-        amount=float(d['amount']),
-        price=float(d['price'])
+        type=side,
+        base_currency=base,
+        target_currency=target,
+        amount=amount,
+        price=price
     )
     db.session.add(o)
-    db.session.commit()
-    return jsonify({'id': o.id}), 201
+    db.session.flush()
+    # match against the book right away; leftovers rest as an OPEN order
+    try:
+        fills = matching_engine.submit(o)
+    except (InsufficientFunds, BookConflict) as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({
+        'id':        o.id,
+        'status':    o.status,
+        'remaining': o.amount,
+        'fills':     fills
+    }), 201
 
 @app.route('/api/orders/<int:order_id>/accept', methods=['POST'])
 @firebase_token_required
@@ -351,24 +666,32 @@ def accept_order(current_user, order_id):
     o = Order.query.get_or_404(order_id)
     if o.user_id == current_user.id or o.status != 'OPEN':
         return jsonify({'error':'Cannot accept'}), 400
-    bw = WalletBalance.query.filter_by(
-        user_id=current_user.id,
-        currency=o.base_currency
-    ).first()
-    if not bw or bw.balance < o.amount:
-        return jsonify({'error':'Insufficient balance'}), 400
-    bw.balance -= o.amount
-    o.status = 'COMPLETED'
-    e = Escrow(
-        order_id=o.id,
-        buyer_id=current_user.id,
-        seller_id=o.user_id,
-        amount=o.amount,
-        price=o.price,
-        target_currency=o.target_currency
-    )
-    db.session.add(e)
-    db.session.commit()
+    # hold the pair's matching lock so no submit can fill this order from the
+    # book between the claim and its removal from the book
+    with matching_engine.pair_lock(o.base_currency, o.target_currency):
+        db.session.refresh(o)
+        # claim the order atomically so two takers cannot both accept it
+        claimed = Order.query.filter_by(id=o.id, status='OPEN') \
+            .update({'status': 'COMPLETED'}, synchronize_session=False)
+        if not claimed:
+            db.session.rollback()
+            return jsonify({'error':'Cannot accept'}), 400
+        try:
+            debit(current_user.id, o.base_currency, o.amount, 'ESCROW_HOLD', ref_id=o.id)
+        except InsufficientFunds:
+            db.session.rollback()
+            return jsonify({'error':'Insufficient balance'}), 400
+        e = Escrow(
+            order_id=o.id,
+            buyer_id=current_user.id,
+            seller_id=o.user_id,
+            amount=o.amount,
+            price=o.price,
+            target_currency=o.target_currency
+        )
+        db.session.add(e)
+        db.session.commit()
+        matching_engine.cancel(o)
     return jsonify({'escrow_id': e.id}), 201
 
 
@@ -378,18 +701,31 @@ def release_escrow(current_user, escrow_id):
     e = Escrow.query.get_or_404(escrow_id)
     if current_user.id != e.seller_id or e.status != 'PENDING':
         return jsonify({'error':'Unauthorized'}), 403
-    sw = WalletBalance.query.filter_by(
-        user_id=e.buyer_id,
-        currency=e.target_currency
-    ).first()
-    if not sw:
-        sw = WalletBalance(user_id=e.buyer_id, currency=e.target_currency, balance=0)
-        db.session.add(sw)
-    sw.balance += e.amount * e.price
-    e.status = 'RELEASED'
+    if not release_escrows([e.id], current_user.id):
+        db.session.rollback()
+        return jsonify({'error':'Unauthorized'}), 403
     db.session.commit()
     return jsonify({'status':'released'}), 200
 
+@app.route('/api/escrow/release-batch', methods=['POST'])
+@firebase_token_required
+def release_escrow_batch(current_user):
+    d   = request.get_json() or {}
+    ids = d.get('escrow_ids') or []
+    try:
+        ids = [int(i) for i in ids]
+    except (TypeError, ValueError):
+        return jsonify({'error':'escrow_ids must be integers'}), 400
+    if not ids:
+        return jsonify({'error':'No escrow ids'}), 400
+    # one transaction for the whole batch
+    released = release_escrows(ids, current_user.id)
+    db.session.commit()
+    return jsonify({
+        'released': released,
+        'skipped':  sorted(set(ids) - set(released))
+    }), 200
+
 @app.route('/api/rating', methods=['POST'])
 @firebase_token_required
 def rate_user(current_user):
@@ -405,12 +741,12 @@ def rate_user(current_user):
     return jsonify({'id': r.id}), 201
 
 
-from utils.location import get_country_from_ip, get_currency_for_country, get_travel_currency_suggestions
+from utils.location import client_ip, get_country_from_ip, get_currency_for_country, get_travel_currency_suggestions
 
 @app.route('/detect-currency', methods=['GET'])
 def detect_currency():
-    # Get the client’s IP address (with fallback to localhost)
-    ip = request.headers.get('X-Forwarded-For', request.remote_addr)
+    # Get the client’s IP address (first X-Forwarded-For hop, else the socket peer)
+    ip = client_ip(request.headers.get('X-Forwarded-For'), request.remote_addr)
 
     # 1. Get the country
     country = get_country_from_ip(ip)
@@ -429,7 +765,7 @@ def detect_currency():
         "default_currency": currency,
         "travel_currency_suggestions": travel_suggestions
     })
-from services.currency_recognition import recognize_currency
+from services.currency_recognition import recognize_currency, recognize_many, MAX_IMAGES as RECOGNITION_MAX_IMAGES
 
 
 @app.route('/recognize-currency', methods=['POST'])
@@ -441,21 +777,83 @@ def recognize_currency_route():
     if file.filename == '':
         return jsonify({"status": "error", "message": "Empty filename"}), 400
 
-    temp_path = os.path.join("uploads", file.filename)
-    os.makedirs("uploads", exist_ok=True)
-    file.save(temp_path)
-
     try:
-        label = recognize_currency(temp_path)
+        label = recognize_currency(file.stream)
         return jsonify({"status": "success", "currency": label})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        os.remove(temp_path)
+
+@app.route('/recognize-currency/batch', methods=['POST'])
+def recognize_currency_batch():
+    files = [f for f in request.files.getlist('images') if f.filename]
+    if not files:
+        return jsonify({"status": "error", "message": "No images uploaded"}), 400
+    if len(files) > RECOGNITION_MAX_IMAGES:
+        return jsonify({"status": "error",
+                        "message": f"At most {RECOGNITION_MAX_IMAGES} images per request"}), 400
+
+    try:
+        labels = recognize_many(f.stream for f in files)
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({
+        "status": "success",
+        "results": [{"filename": f.filename, "currency": label}
+                    for f, label in zip(files, labels)]
+    })
+
+
+# -------------------------- CLI Commands --------------------------
+@app.cli.command('rebuild-rate-buckets')
+def rebuild_rate_buckets_command():
+    """Recompute the hourly transaction buckets behind /exchangeRate."""
+    print(f'Rebuilt {rebuild_buckets()} hourly buckets')
+
+@app.cli.command('backfill-candles')
+def backfill_candles_command():
+    """Rebuild the OHLC candles behind /api/candles from all past trades."""
+    print(f'Rebuilt {backfill_candles()} candles')
+
+@app.cli.command('build-geoip')
+@click.argument('csv_path')
+@click.argument('out_path', default=GEOIP_DB_PATH)
+def build_geoip_command(csv_path, out_path):
+    """Build the offline IP -> country database used by /detect-currency."""
+    print(f'Wrote {build_geoip(csv_path, out_path)} ranges to {out_path}')
+
+
+# -------------------------- Background Workers --------------------------
+def _env_flag(name, default='0'):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+# Forecast pool workers are spawned and re-import this module as __mp_main__;
+# only the parent process preloads and runs the background threads
+_main_process = multiprocessing.parent_process() is None
+
+# Import the subsystems listed in PRELOAD_SUBSYSTEMS now instead of on first request
+if _main_process:
+    preload()
+
+# Re-render the popular forecast charts as soon as new rates land
+ingest_hooks.append(prerender_charts)
+
+# Fired triggers reach /api/stream/rates subscribers whoever evaluated them
+alert_hooks.append(publish_alerts)
+
+if _main_process and _env_flag('RATE_INGEST_ENABLED'):
+    start_rate_ingestion(app)
+
+if _main_process and _env_flag('FIRESTORE_SYNC_ENABLED'):
+    start_outbox_worker(app)
+
+if _main_process and _env_flag('GOLD_REFRESH_ENABLED'):
+    start_gold_refresh()
 
 
 # -------------------------- App Runner --------------------------
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        trigger_index.sync()
+        matching_engine.load()
     app.run(debug=True)
\ No newline at end of file
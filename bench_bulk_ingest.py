@@ -0,0 +1,64 @@
+# bench_bulk_ingest.py
+#
+# Throughput of the bulk transaction path behind POST /transactions/bulk
+# (NDJSON parse, vectorized validation, chunked multi-row inserts):
+#   BENCH_DB_URI=mysql+pymysql://... python bench_bulk_ingest.py [rows]
+#
+# Defaults to the app's DB_CONFIG. Tables are created if missing and the
+# rows written for the benchmark user are removed afterwards.
+
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+from flask import Flask
+
+from db_config import DB_CONFIG
+from model import db
+from model.user import User
+from model.transaction import Transaction
+from model.firestore_outbox import FirestoreOutbox
+from services.bulk_ingest import parse_rows, validate_rows, insert_transactions
+
+def run(n_rows=50000, seed=42):
+    rng = random.Random(seed)
+    body = '\n'.join(json.dumps({
+        'usd_amount': round(rng.uniform(1, 1000), 2),
+        'lbp_amount': round(rng.uniform(89000, 90000000), 0),
+        'usd_to_lbp': rng.random() < 0.5
+    }) for _ in range(n_rows)).encode()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('BENCH_DB_URI', DB_CONFIG)
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        user = User(firebase_uid=f'bench-{uuid.uuid4().hex}')
+        db.session.add(user)
+        db.session.commit()
+        try:
+            start = time.perf_counter()
+            rows = parse_rows(body, 'application/x-ndjson')
+            parsed = time.perf_counter()
+            valid, errors = validate_rows(rows)
+            validated = time.perf_counter()
+            inserted, db_errors = insert_transactions(valid, user.id)
+            elapsed = time.perf_counter() - start
+            print(f"{inserted} rows in {elapsed:.3f}s -> {inserted / elapsed:,.0f} rows/sec "
+                  f"(parse {parsed - start:.3f}s, validate {validated - parsed:.3f}s, "
+                  f"insert {elapsed - (validated - start):.3f}s; "
+                  f"{len(errors) + len(db_errors)} errors)")
+        finally:
+            Transaction.query.filter_by(user_id=user.id).delete()
+            FirestoreOutbox.query.filter(
+                FirestoreOutbox.payload.like(f'{{"user_id": {user.id},%')
+            ).delete(synchronize_session=False)
+            db.session.delete(user)
+            db.session.commit()
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,31 @@
+# bench_matching.py
+#
+# Throughput of the in-memory P2P matching engine (no DB, no HTTP):
+#   python bench_matching.py [orders]
+
+import random
+import sys
+import time
+
+from services.matching_engine import OrderBook
+
+def run(n_orders=200000, seed=42):
+    rng = random.Random(seed)
+    orders = [
+        (i, rng.randrange(1000), rng.choice(('BUY', 'SELL')),
+         round(rng.gauss(89500, 150), 0), round(rng.uniform(1, 500), 2))
+        for i in range(n_orders)
+    ]
+    book = OrderBook()
+    fills = 0
+    start = time.perf_counter()
+    for order_id, user_id, side, price, amount in orders:
+        f, _ = book.submit(order_id, user_id, side, price, amount)
+        fills += len(f)
+    elapsed = time.perf_counter() - start
+    print(f"{n_orders} orders, {fills} fills in {elapsed:.3f}s "
+          f"-> {n_orders / elapsed:,.0f} orders/sec "
+          f"({len(book.orders)} left resting)")
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
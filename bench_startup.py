@@ -0,0 +1,74 @@
+# bench_startup.py
+#
+# Import time and resident memory of the app and of each heavy subsystem,
+# every measurement in a fresh interpreter:
+#   python bench_startup.py [subsystem ...]
+
+import json
+import os
+import subprocess
+import sys
+
+from services.preload import SUBSYSTEMS
+
+CHILD = r'''
+import importlib, json, sys, time
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+out = {'base_mb': rss_mb()}
+start = time.perf_counter()
+import app
+out['app_s'], out['app_mb'] = time.perf_counter() - start, rss_mb()
+start = time.perf_counter()
+for module in sys.argv[1:]:
+    importlib.import_module(module)
+out['sub_s'], out['sub_mb'] = time.perf_counter() - start, rss_mb()
+print(json.dumps(out))
+'''
+
+def measure(modules):
+    env = dict(os.environ, FIRESTORE_SYNC_ENABLED='0', RATE_INGEST_ENABLED='0',
+               PRELOAD_SUBSYSTEMS='')
+    proc = subprocess.run([sys.executable, '-c', CHILD, *modules],
+                          capture_output=True, text=True, env=env,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        return None, proc.stderr.strip().splitlines()[-1]
+    return json.loads(proc.stdout.strip().splitlines()[-1]), None
+
+def run(names):
+    app, err = measure([])
+    if app is None:
+        print(f"import app failed: {err}")
+        return
+    print(f"{'app (lazy)':<14} {app['app_s']:7.2f}s {app['app_mb'] - app['base_mb']:8.1f} MB")
+
+    everything = []
+    for name in names:
+        modules = SUBSYSTEMS[name]
+        res, err = measure(modules)
+        if res is None:
+            print(f"{'+ ' + name:<14} unavailable ({err})")
+            continue
+        everything += [m for m in modules if m not in everything]
+        print(f"{'+ ' + name:<14} {res['sub_s']:7.2f}s {res['sub_mb'] - res['app_mb']:8.1f} MB")
+
+    res, err = measure(everything)
+    if res is not None:
+        # every available subsystem imported up front, as before lazy loading
+        print(f"{'app (eager)':<14} {res['app_s'] + res['sub_s']:7.2f}s "
+              f"{res['sub_mb'] - res['base_mb']:8.1f} MB")
+
+if __name__ == '__main__':
+    run(sys.argv[1:] or list(SUBSYSTEMS))
@@ -5,7 +5,12 @@ from flask_bcrypt import Bcrypt
 db = SQLAlchemy()
 ma = Marshmallow()
 bcrypt = Bcrypt()
+from .user import User
 from .wallet import WalletBalance
 from .order import Order
 from .escrow import Escrow
 from .rating import Rating
+from .rate_history import RateHistory, RateCoverage
+from .firestore_outbox import FirestoreOutbox
+from .ledger import LedgerEntry
+from .candle import Candle
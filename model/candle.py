@@ -0,0 +1,23 @@
+from model import db
+
+class Candle(db.Model):
+    """OHLC/volume for one pair and interval, maintained as trades land."""
+    __tablename__ = 'candles'
+    id           = db.Column(db.Integer, primary_key=True)
+    pair         = db.Column(db.String(6), nullable=False)     # base + quote, e.g. USDLBP
+    interval     = db.Column(db.String(3), nullable=False)     # 1m, 1h, 1d
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    open         = db.Column(db.Float, nullable=False)
+    high         = db.Column(db.Float, nullable=False)
+    low          = db.Column(db.Float, nullable=False)
+    close        = db.Column(db.Float, nullable=False)
+    volume       = db.Column(db.Float, nullable=False, default=0.0)   # in base currency
+    trade_count  = db.Column(db.Integer, nullable=False, default=0)
+    # times of the trades behind open/close, so late or out-of-order
+    # updates only move open/close when they are earlier/later
+    open_at      = db.Column(db.DateTime, nullable=False)
+    close_at     = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('pair', 'interval', 'bucket_start', name='uq_candle_pair_interval_start'),
+    )
@@ -0,0 +1,21 @@
+from model import db
+from datetime import datetime
+
+class FirestoreOutbox(db.Model):
+    """Documents waiting to be written to Firestore by the background sync worker."""
+    __tablename__   = 'firestore_outbox'
+    id              = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)
+    collection      = db.Column(db.String(64), nullable=False)
+    payload         = db.Column(db.Text, nullable=False)        # JSON document
+    status          = db.Column(db.Enum('PENDING','SENT','FAILED',
+                                        name='outbox_status'), default='PENDING')
+    attempts        = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error      = db.Column(db.Text)
+    created_at      = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at         = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
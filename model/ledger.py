@@ -0,0 +1,17 @@
+from model import db
+from datetime import datetime
+
+class LedgerEntry(db.Model):
+    """Append-only record of every wallet movement; balances are the running sum."""
+    __tablename__ = 'ledger_entries'
+    id         = db.Column(db.Integer, primary_key=True)
+    user_id    = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    currency   = db.Column(db.String(3), nullable=False)
+    amount     = db.Column(db.Numeric(20, 8), nullable=False)   # signed
+    entry_type = db.Column(db.String(16), nullable=False)       # DEPOSIT, ESCROW_HOLD, ESCROW_RELEASE
+    ref_id     = db.Column(db.Integer)                           # order / escrow id
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_ledger_user_currency', 'user_id', 'currency'),
+    )
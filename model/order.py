@@ -15,3 +15,8 @@ class Order(db.Model):
     created_at        = db.Column(db.DateTime, default=datetime.utcnow)
 
     user = db.relationship('User', backref='orders')
+
+    __table_args__ = (
+        # order-book reads: open orders of one pair, walked by price
+        db.Index('ix_orders_book', 'status', 'base_currency', 'target_currency', 'price'),
+    )
@@ -0,0 +1,24 @@
+from model import db
+from datetime import datetime
+
+class RateHistory(db.Model):
+    __tablename__ = 'rate_history'
+    id       = db.Column(db.Integer, primary_key=True)
+    source   = db.Column(db.String(3), nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    date     = db.Column(db.Date, nullable=False)
+    rate     = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('source', 'currency', 'date', name='uq_rate_history_pair_date'),
+    )
+
+class RateCoverage(db.Model):
+    """Contiguous [first_date, last_date] window already pulled from Frankfurter for a pair."""
+    __tablename__ = 'rate_coverage'
+    source     = db.Column(db.String(3), primary_key=True)
+    currency   = db.Column(db.String(3), primary_key=True)
+    first_date = db.Column(db.Date, nullable=False)
+    last_date  = db.Column(db.Date, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           onupdate=datetime.utcnow)
@@ -9,6 +9,27 @@ class Transaction(db.Model):
     added_date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     user_id    = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (
+        # /exchangeRate aggregates one direction over a recent date window
+        db.Index('ix_transaction_direction_date', 'usd_to_lbp', 'added_date'),
+        # /transactions pages through one user's history newest-first
+        db.Index('ix_transaction_user_date_id', 'user_id', 'added_date', 'id'),
+    )
+
+class TransactionHourlyBucket(db.Model):
+    """Running USD/LBP totals per direction and UTC hour, maintained on insert."""
+    __tablename__ = 'transaction_hourly_buckets'
+    id           = db.Column(db.Integer, primary_key=True)
+    usd_to_lbp   = db.Column(db.Boolean, nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    usd_total    = db.Column(db.Float, nullable=False, default=0.0)
+    lbp_total    = db.Column(db.Float, nullable=False, default=0.0)
+    txn_count    = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('usd_to_lbp', 'bucket_start', name='uq_txn_bucket_direction_hour'),
+    )
+
 class TransactionSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = Transaction
@@ -5,6 +5,11 @@ class WalletBalance(db.Model):
     id       = db.Column(db.Integer, primary_key=True)
     user_id  = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     currency = db.Column(db.String(3), nullable=False)
-    balance  = db.Column(db.Float, nullable=False, default=0.0)
+    # materialized sum of the user's LedgerEntry rows for this currency
+    balance  = db.Column(db.Numeric(20, 8), nullable=False, default=0)
 
-    user = db.relationship('User', backref='wallets')
\ No newline at end of file
+    user = db.relationship('User', backref='wallets')
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'currency', name='uq_wallet_user_currency'),
+    )
@@ -0,0 +1,63 @@
+import os
+import time
+import hashlib
+from collections import namedtuple
+from sqlalchemy.exc import IntegrityError
+
+from model import db
+from model.user import User
+from services.cache import TTLCache
+
+# What routes receive as `current_user`: just the columns they read, so a
+# repeat caller never touches the database.
+AuthUser = namedtuple('AuthUser', 'id firebase_uid email')
+
+# sha256(token) -> decoded claims, never kept past the token's own `exp`
+_token_cache = TTLCache(
+    maxsize=int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('AUTH_TOKEN_CACHE_TTL', 300))
+)
+# firebase uid -> AuthUser
+_user_cache = TTLCache(
+    maxsize=int(os.getenv('AUTH_USER_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('AUTH_USER_CACHE_TTL', 3600))
+)
+
+def auth_cache_stats():
+    return {'tokens': _token_cache.stats(), 'users': _user_cache.stats()}
+
+def verify_token(token):
+    """Decoded Firebase claims for `token`, verified once and then served from memory until it expires."""
+    key = hashlib.sha256(token.encode()).hexdigest()
+    claims = _token_cache.get(key)
+    if claims is not None and claims.get('exp', 0) > time.time():
+        return claims
+    import firebase_config                     # initialize_app() on first use
+    from firebase_admin import auth as firebase_auth
+    claims = firebase_auth.verify_id_token(token)
+    ttl = min(_token_cache.ttl, claims.get('exp', 0) - time.time())
+    if ttl > 0:
+        _token_cache.set(key, claims, ttl=ttl)
+    return claims
+
+def resolve_user(claims):
+    """AuthUser for the token's uid, creating the User row on first sight."""
+    uid = claims['uid']
+    cached = _user_cache.get(uid)
+    if cached is not None:
+        return cached
+
+    user = User.query.filter_by(firebase_uid=uid).first()
+    if user is None:
+        try:
+            user = User(firebase_uid=uid, email=claims.get('email'))
+            db.session.add(user)
+            db.session.commit()
+        except IntegrityError:
+            # a concurrent first request inserted the same uid; use that row
+            db.session.rollback()
+            user = User.query.filter_by(firebase_uid=uid).first()
+
+    auth_user = AuthUser(user.id, user.firebase_uid, user.email)
+    _user_cache.set(uid, auth_user)
+    return auth_user
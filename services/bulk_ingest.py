@@ -0,0 +1,150 @@
+import os
+import json
+import math
+import uuid
+from datetime import datetime
+
+from model import db
+from model.transaction import Transaction
+from model.firestore_outbox import FirestoreOutbox
+from services.rate_buckets import buckets_enabled, record_transactions
+from services.candles import candles_enabled, record_trades, Trade, TXN_PAIR
+
+CHUNK_SIZE = int(os.getenv('BULK_INSERT_CHUNK', 2000))
+MAX_ROWS   = int(os.getenv('BULK_MAX_ROWS', 100000))
+
+_TRUE  = {True, 1, '1', 'true', 'True', 'TRUE'}
+_FALSE = {False, 0, '0', 'false', 'False', 'FALSE'}
+
+
+def _as_bool(value):
+    try:
+        return True if value in _TRUE else False if value in _FALSE else None
+    except TypeError:                     # unhashable, e.g. a nested list
+        return None
+
+
+class BulkPayloadError(ValueError):
+    """The body could not be read as a JSON array or NDJSON at all."""
+
+
+def parse_rows(body, content_type=''):
+    """
+    Read a JSON array or NDJSON body into a list of rows.
+
+    Unparseable NDJSON lines become None (reported as row errors) so the
+    remaining lines are still ingested.
+    """
+    text = body.decode('utf-8') if isinstance(body, bytes) else body
+    stripped = text.lstrip()
+    if 'ndjson' not in content_type and stripped.startswith('['):
+        try:
+            rows = json.loads(text)
+        except ValueError as e:
+            raise BulkPayloadError(f'Invalid JSON array: {e}')
+        if not isinstance(rows, list):
+            raise BulkPayloadError('Expected a JSON array of transactions')
+        return rows
+
+    rows = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except ValueError:
+            rows.append(None)
+    return rows
+
+def validate_rows(rows):
+    """
+    Validate all rows in one vectorized pass.
+
+    Returns (frame of valid rows with `row`, `usd_amount`, `lbp_amount`,
+    `usd_to_lbp`, `added_date` columns, [{'row', 'error'}]). Rows are
+    numbered from 0 in upload order; only the first problem of a row is
+    reported.
+    """
+    import pandas as pd
+
+    records = [r if isinstance(r, dict) else {} for r in rows]
+    df = pd.DataFrame.from_records(records, columns=['usd_amount', 'lbp_amount',
+                                                     'usd_to_lbp', 'added_date'])
+    df['row'] = range(len(df))
+    usd = pd.to_numeric(df['usd_amount'], errors='coerce')
+    lbp = pd.to_numeric(df['lbp_amount'], errors='coerce')
+    direction = df['usd_to_lbp'].map(_as_bool, na_action='ignore')
+    dates = pd.to_datetime(df['added_date'], errors='coerce', utc=True, format='ISO8601')
+    now = pd.Timestamp(datetime.utcnow(), tz='UTC')
+
+    checks = [
+        (pd.Series([not isinstance(r, dict) for r in rows], index=df.index, dtype=bool),
+         'Row is not a JSON object'),
+        # "inf" parses as a number but cannot be stored or served as JSON
+        (~((usd > 0) & usd.map(math.isfinite)), 'usd_amount must be a positive number'),
+        (~((lbp > 0) & lbp.map(math.isfinite)), 'lbp_amount must be a positive number'),
+        (direction.isna(), 'usd_to_lbp must be true or false'),
+        (df['added_date'].notna() & dates.isna(), 'added_date must be an ISO-8601 timestamp'),
+        # buckets and candles only ever look backwards from now
+        (dates > now, 'added_date cannot be in the future'),
+    ]
+    error = pd.Series(None, index=df.index, dtype=object)
+    for failed, message in checks:
+        error = error.mask(error.isna() & failed, message)
+
+    ok = error.isna()
+    # naive UTC like Transaction.added_date; rows without one are stamped now
+    added = dates[ok].dt.tz_convert(None).fillna(now.tz_convert(None))
+    valid = pd.DataFrame({
+        'row':        df['row'][ok],
+        'usd_amount': usd[ok].astype(float),
+        'lbp_amount': lbp[ok].astype(float),
+        'usd_to_lbp': direction[ok].astype(bool),
+        'added_date': added
+    })
+    errors = [{'row': int(i), 'error': e} for i, e in error[~ok].items()]
+    return valid, errors
+
+def insert_transactions(valid, user_id, chunk_size=CHUNK_SIZE):
+    """
+    Insert validated rows for `user_id` with one multi-row INSERT per chunk.
+
+    Each chunk commits together with its Firestore outbox rows, hourly
+    bucket increments and candle updates; a chunk the database rejects is rolled back and all
+    its rows are reported as errors. Returns (inserted, errors).
+    """
+    inserted, errors = 0, []
+    to_bucket, to_candles = buckets_enabled(), candles_enabled()
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid.iloc[start:start + chunk_size]
+        txns, outbox = [], []
+        for usd, lbp, direction, added in zip(
+                chunk['usd_amount'], chunk['lbp_amount'],
+                chunk['usd_to_lbp'], chunk['added_date']):
+            added = added.to_pydatetime()
+            # same shape (and key order) as firestore_sync.transaction_document
+            txn = {'user_id': user_id, 'usd_amount': float(usd),
+                   'lbp_amount': float(lbp), 'usd_to_lbp': bool(direction),
+                   'added_date': added}
+            txns.append(txn)
+            outbox.append({
+                'idempotency_key': uuid.uuid4().hex,
+                'collection':      'transactions',
+                'payload':         json.dumps(dict(txn, added_date=added.isoformat()))
+            })
+        try:
+            db.session.execute(db.insert(Transaction), txns)
+            db.session.execute(db.insert(FirestoreOutbox), outbox)
+            if to_bucket:
+                record_transactions((t['usd_to_lbp'], t['added_date'],
+                                     t['usd_amount'], t['lbp_amount']) for t in txns)
+            if to_candles:
+                record_trades(Trade(TXN_PAIR, t['added_date'], t['lbp_amount'] / t['usd_amount'],
+                                    t['usd_amount']) for t in txns)
+            db.session.commit()
+            inserted += len(txns)
+        except Exception as e:
+            db.session.rollback()
+            errors.extend({'row': int(r), 'error': f'Database error: {e.__class__.__name__}'}
+                          for r in chunk['row'])
+    return inserted, errors
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """An in-progress load that other callers for the same key can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe cache with per-entry TTL, LRU eviction and single-flight loads.
+
+    `get_or_load(key, loader)` returns a fresh cached value when there is one.
+    Otherwise exactly one caller runs `loader()` while every concurrent caller
+    asking for the same key waits for that result instead of calling upstream.
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self._data   = OrderedDict()     # key -> (expires_at, value)
+        self._flights = {}               # key -> _Flight
+        self._lock   = threading.Lock()
+        self.hits      = 0
+        self.misses    = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def get_or_load(self, key, loader, ttl=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._store(key, flight.value, ttl)
+                self._flights.pop(key, None)
+            flight.done.set()
+        return flight.value
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size':      len(self._data),
+                'maxsize':   self.maxsize,
+                'ttl':       self.ttl,
+                'hits':      self.hits,
+                'misses':    self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions
+            }
+
+    # -- internals (caller holds self._lock) --
+    def _lookup(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _store(self, key, value, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,158 @@
+import os
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+
+from model import db
+from model.candle import Candle
+from model.transaction import Transaction
+from model.order import Order
+from model.escrow import Escrow
+
+# Optional OHLC roll-up of the trade flow. When enabled, every transaction
+# insert and escrow release folds into its 1m/1h/1d candles, so /api/candles
+# reads one row per bucket instead of scanning trades.
+
+TXN_PAIR  = 'USDLBP'                                # desk transactions: LBP per USD
+INTERVALS = {'1m': 'min', '1h': 'h', '1d': 'D'}     # interval -> pandas frequency
+
+Trade = namedtuple('Trade', 'pair at price volume')
+
+def candles_enabled():
+    return os.getenv('CANDLES_ENABLED', '0').lower() in ('1', 'true', 'yes')
+
+def bucket_start(ts, interval):
+    ts = ts.replace(second=0, microsecond=0)
+    if interval in ('1h', '1d'):
+        ts = ts.replace(minute=0)
+    if interval == '1d':
+        ts = ts.replace(hour=0)
+    return ts
+
+def transaction_trade(txn):
+    return Trade(TXN_PAIR, txn.added_date, txn.lbp_amount / txn.usd_amount, txn.usd_amount)
+
+def escrow_trades(escrows, at=None):
+    """Trades for released escrows, priced in the order's target currency per base unit."""
+    at = at or datetime.utcnow()
+    bases = dict(db.session.query(Order.id, Order.base_currency)
+                 .filter(Order.id.in_({e.order_id for e in escrows})))
+    return [Trade(bases[e.order_id] + e.target_currency, at, e.price, e.amount)
+            for e in escrows if e.order_id in bases]
+
+def record_trades(trades):
+    """
+    Fold trades into their candles with one UPDATE (or INSERT) per touched bucket.
+
+    Trades are pre-aggregated per bucket; high/low/volume merge in SQL and
+    open/close only move when the new trades are earlier/later than the
+    ones already counted. The caller commits together with the trades.
+    """
+    agg = {}
+    for t in sorted(trades, key=lambda t: t.at):
+        for interval in INTERVALS:
+            key = (t.pair, interval, bucket_start(t.at, interval))
+            c = agg.get(key)
+            if c is None:
+                agg[key] = [t.price, t.price, t.price, t.price, t.volume, 1, t.at, t.at]
+            else:
+                c[1] = max(c[1], t.price)
+                c[2] = min(c[2], t.price)
+                c[3] = t.price
+                c[4] += t.volume
+                c[5] += 1
+                c[7] = t.at
+    for (pair, interval, start), values in agg.items():
+        _merge(pair, interval, start, *values)
+
+def get_candles(pair, interval, start=None, end=None, limit=500):
+    """The latest `limit` candles in [start, end), oldest first."""
+    q = Candle.query.filter_by(pair=pair, interval=interval)
+    if start is not None:
+        q = q.filter(Candle.bucket_start >= start)
+    if end is not None:
+        q = q.filter(Candle.bucket_start < end)
+    rows = q.order_by(Candle.bucket_start.desc()).limit(limit).all()
+    return rows[::-1]
+
+def backfill_candles(chunk_size=5000):
+    """
+    Rebuild every candle from transactions and released escrows in one
+    vectorized pandas pass (backfill after enabling). Escrows are dated by
+    their last update, which is when they were released.
+    """
+    import pandas as pd
+
+    txns = pd.DataFrame(db.session.execute(db.select(
+        Transaction.added_date, Transaction.usd_amount, Transaction.lbp_amount
+    ).where(Transaction.added_date.isnot(None), Transaction.usd_amount > 0)).all(),
+        columns=['at', 'volume', 'quote'])
+    txns['pair']  = TXN_PAIR
+    txns['price'] = txns['quote'] / txns['volume']
+
+    escrows = pd.DataFrame(db.session.execute(db.select(
+        Escrow.updated_at, Escrow.amount, Escrow.price,
+        Order.base_currency, Escrow.target_currency
+    ).join(Order, Order.id == Escrow.order_id)
+     .where(Escrow.status == 'RELEASED', Escrow.updated_at.isnot(None))).all(),
+        columns=['at', 'volume', 'price', 'base', 'target'])
+    escrows['pair'] = escrows['base'] + escrows['target']
+
+    cols = ['pair', 'at', 'price', 'volume']
+    trades = pd.concat([txns[cols], escrows[cols]], ignore_index=True)
+    trades['at'] = pd.to_datetime(trades['at'])
+    trades = trades.sort_values('at', kind='mergesort')
+
+    frames = []
+    for interval, freq in INTERVALS.items():
+        out = trades.assign(bucket_start=trades['at'].dt.floor(freq)) \
+            .groupby(['pair', 'bucket_start'], sort=False) \
+            .agg(open=('price', 'first'), high=('price', 'max'), low=('price', 'min'),
+                 close=('price', 'last'), volume=('volume', 'sum'),
+                 trade_count=('price', 'size'), open_at=('at', 'min'), close_at=('at', 'max')) \
+            .reset_index()
+        out['interval'] = interval
+        frames.append(out)
+
+    Candle.query.delete()
+    count = 0
+    for out in frames:
+        records = out.to_dict('records')
+        for r in records:
+            for k in ('bucket_start', 'open_at', 'close_at'):
+                r[k] = r[k].to_pydatetime()
+            r['trade_count'] = int(r['trade_count'])
+        for i in range(0, len(records), chunk_size):
+            db.session.execute(db.insert(Candle), records[i:i + chunk_size])
+        count += len(records)
+    db.session.commit()
+    return count
+
+def _merge(pair, interval, start, o, h, l, c, v, n, open_at, close_at):
+    C = Candle
+    # Every SET reads the old row on SQLite/Postgres; MySQL applies them left
+    # to right, so open/close are assigned before the timestamps they test.
+    stmt = db.update(C).where(
+        C.pair == pair, C.interval == interval, C.bucket_start == start
+    ).ordered_values(
+        (C.open,        db.case((C.open_at > open_at, o), else_=C.open)),
+        (C.open_at,     db.case((C.open_at > open_at, open_at), else_=C.open_at)),
+        (C.close,       db.case((C.close_at <= close_at, c), else_=C.close)),
+        (C.close_at,    db.case((C.close_at <= close_at, close_at), else_=C.close_at)),
+        (C.high,        db.case((C.high < h, h), else_=C.high)),
+        (C.low,         db.case((C.low > l, l), else_=C.low)),
+        (C.volume,      C.volume + v),
+        (C.trade_count, C.trade_count + n)
+    ).execution_options(synchronize_session=False)
+    for _ in range(2):
+        if db.session.execute(stmt).rowcount:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(C(pair=pair, interval=interval, bucket_start=start,
+                                 open=o, high=h, low=l, close=c, volume=v,
+                                 trade_count=n, open_at=open_at, close_at=close_at))
+            return
+        except IntegrityError:
+            # another writer created the candle first; merge into it instead
+            continue
@@ -0,0 +1,63 @@
+import io
+import os
+import hashlib
+import logging
+
+from services.cache import TTLCache
+from services.rate_store import get_history_df
+from services.prediction import forecast_rates_hw
+
+log = logging.getLogger(__name__)
+
+# Rendered PNGs keyed by (source, currency, history_days, forecast_days,
+# last data date); a new day of data produces a new key.
+_chart_cache = TTLCache(
+    maxsize=int(os.getenv('CHART_CACHE_SIZE', 128)),
+    ttl=float(os.getenv('CHART_CACHE_TTL', 86400))
+)
+
+def chart_cache_stats():
+    return _chart_cache.stats()
+
+def render_forecast_png(dfh, dfp, source, currency):
+    """Draw history + forecast on a standalone Agg canvas (no pyplot global state)."""
+    import pandas as pd
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    import matplotlib.dates as mdates
+
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(dfh['date'], dfh['rate'], label='Historical')
+    ax.plot(pd.to_datetime(dfp['date']), dfp['yhat'],
+            linestyle='--', marker='x', label='Forecast')
+    ax.set_title(f'{source} → {currency} Forecast')
+    ax.set_xlabel('Date'); ax.set_ylabel('Rate')
+    ax.legend()
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+    fig.autofmt_xdate()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+def get_forecast_chart(source='USD', currency='EUR', history_days=30, forecast_days=7):
+    """Return (png_bytes, etag) for the pair, rendering only when the data changed."""
+    dfh = get_history_df(source, currency, history_days)
+    last_date = dfh['date'].iloc[-1] if not dfh.empty else None
+    key = (source, currency, history_days, forecast_days, last_date)
+
+    def render():
+        dfp = forecast_rates_hw(source, currency, history_days, forecast_days, history=dfh)
+        png = render_forecast_png(dfh, dfp, source, currency)
+        return png, hashlib.sha1(png).hexdigest()
+
+    return _chart_cache.get_or_load(key, render)
+
+def prerender_charts(pairs, history_days=30, forecast_days=7):
+    """Warm the chart cache for popular pairs, e.g. right after a rate ingestion."""
+    for source, currency in pairs:
+        try:
+            get_forecast_chart(source, currency, history_days, forecast_days)
+        except Exception as e:
+            log.warning('Chart pre-render failed for %s/%s: %s', source, currency, e)
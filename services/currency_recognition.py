@@ -1,22 +1,101 @@
 # services/currency_recognition.py
 
-import tensorflow as tf
-from tensorflow.keras.preprocessing import image
-import numpy as np
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
 
-# Load the trained dummy model
-model = tf.keras.models.load_model("models/currency_model.h5")
+from services.metrics import span, timed
+
+MODEL_PATH = os.getenv("CURRENCY_MODEL_PATH", "models/currency_model.h5")
 
 # Class labels must match training order
 class_labels = ["USD_1", "USD_10", "LBP_5000", "EUR_5", "EUR_10"]
 
-def recognize_currency(img_path):
-    # Load image and preprocess
-    img = image.load_img(img_path, target_size=(224, 224))
-    img_array = image.img_to_array(img)
-    img_array = np.expand_dims(img_array, axis=0) / 255.0
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """Load the Keras model on first use instead of at import time."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            import tensorflow as tf
+            _model = tf.keras.models.load_model(MODEL_PATH)
+        return _model
+
+@timed()
+def preprocess(stream):
+    """Decode an uploaded image stream in memory into a (224, 224, 3) array in [0, 1]."""
+    import numpy as np
+    from PIL import Image
+    img = Image.open(stream).convert("RGB")
+    # nearest-neighbour resize, like keras' load_img default used in training
+    img = img.resize((224, 224), Image.NEAREST)
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+
+class MicroBatcher:
+    """
+    Collects images from concurrent requests for up to `window_ms` (or until
+    `max_batch` are waiting) and runs them through a single batched predict.
+    """
+
+    def __init__(self, max_batch=32, window_ms=5):
+        self.max_batch = max_batch
+        self.window    = window_ms / 1000.0
+        self._queue    = queue.Queue()
+        self._started  = False
+        self._lock     = threading.Lock()
+
+    def submit(self, array):
+        fut = Future()
+        self._ensure_worker()
+        self._queue.put((array, fut))
+        return fut
+
+    def _ensure_worker(self):
+        with self._lock:
+            if not self._started:
+                threading.Thread(target=self._run, name="currency-recognition",
+                                 daemon=True).start()
+                self._started = True
+
+    def _run(self):
+        import numpy as np
+        while True:
+            batch = [self._queue.get()]
+            # one window from the first image, however many more arrive
+            deadline = time.monotonic() + self.window
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                pass
+            try:
+                with span("currency_recognition.predict"):
+                    probs = get_model().predict(np.stack([a for a, _ in batch]), verbose=0)
+                for (_, fut), p in zip(batch, probs):
+                    fut.set_result(class_labels[int(np.argmax(p))])
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+
+
+_batcher = MicroBatcher(
+    max_batch=int(os.getenv("RECOGNITION_MAX_BATCH", 32)),
+    window_ms=float(os.getenv("RECOGNITION_BATCH_WINDOW_MS", 5))
+)
+
+# Most images one /recognize-currency/batch request may upload
+MAX_IMAGES = int(os.getenv("RECOGNITION_MAX_IMAGES", _batcher.max_batch))
+
+@timed()
+def recognize_many(streams):
+    """Labels for several uploaded image streams; they share batches with other requests."""
+    futures = [_batcher.submit(preprocess(s)) for s in streams]
+    return [f.result() for f in futures]
 
-    # Predict
-    predictions = model.predict(img_array)
-    predicted_class = np.argmax(predictions[0])
-    return class_labels[predicted_class]
+def recognize_currency(stream):
+    return recognize_many([stream])[0]
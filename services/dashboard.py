@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from services.exchange_api import get_live_rates
+from services.gold_api import get_gold_price
+
+
+class Bulkhead:
+    """
+    A small thread pool for one upstream, with no queue behind it.
+
+    Upstream calls keep running after their deadline passes (whatever they
+    return still lands in the rate/gold caches), so a stalled upstream
+    gradually holds every slot of its own bulkhead. New calls for it then
+    fail at once instead of waiting, and other upstreams are unaffected.
+    """
+
+    def __init__(self, name, size):
+        self.name  = name
+        self._pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f'dashboard-{name}')
+        self._free = threading.BoundedSemaphore(size)
+
+    def submit(self, fn):
+        if not self._free.acquire(blocking=False):
+            fut = Future()
+            fut.set_exception(RuntimeError(f'{self.name} is saturated by slow calls'))
+            return fut
+
+        def run():
+            try:
+                return fn()
+            finally:
+                self._free.release()
+        return self._pool.submit(run)
+
+
+_size = int(os.getenv('DASHBOARD_WORKERS', 8))
+bulkheads = {
+    'frankfurter': Bulkhead('frankfurter', _size),
+    'yahoo':       Bulkhead('yahoo', _size)
+}
+
+MAX_EXTRA_PAIRS = 20
+
+def parse_pairs(raw):
+    """'EUR:USD,GBP:JPY' -> [('EUR', 'USD'), ('GBP', 'JPY')]"""
+    pairs = []
+    for item in (raw or '').split(','):
+        if ':' in item:
+            base, target = item.strip().upper().split(':', 1)
+            if base and target and (base, target) not in pairs:
+                pairs.append((base, target))
+    return pairs
+
+def configured_extra_pairs():
+    return parse_pairs(os.getenv('DASHBOARD_EXTRA_PAIRS', ''))
+
+def fan_out(tasks):
+    """
+    Run {name: (fn, timeout_seconds, bulkhead)} concurrently.
+
+    Every deadline counts from the same start, so the call returns after at
+    most the largest timeout. Returns (results, errors); a source that
+    missed its deadline or raised is only in `errors`.
+    """
+    start = time.monotonic()
+    futures = {
+        name: (bulkhead.submit(fn), start + timeout)
+        for name, (fn, timeout, bulkhead) in tasks.items()
+    }
+    results, errors = {}, {}
+    for name, (fut, deadline) in futures.items():
+        try:
+            results[name] = fut.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FuturesTimeout:
+            errors[name] = f'Timed out after {deadline - start:.1f}s'
+        except Exception as e:
+            errors[name] = str(e)
+    return results, errors
+
+def dashboard_rates(extra_pairs=()):
+    """
+    Live FX quotes, the gold price and the quotes for `extra_pairs` (one
+    upstream call per base), fetched concurrently.
+
+    `partial` lists the sources that failed or timed out; their fields are
+    None (or missing from `extra_rates`) and `errors` says why.
+    """
+    rates_timeout = float(os.getenv('DASHBOARD_RATES_TIMEOUT', 2))
+    gold_timeout  = float(os.getenv('DASHBOARD_GOLD_TIMEOUT', 2))
+
+    tasks = {
+        'currency_rates': (get_live_rates, rates_timeout, bulkheads['frankfurter']),
+        'gold_price':     (get_gold_price, gold_timeout, bulkheads['yahoo'])
+    }
+    by_base = defaultdict(list)
+    for base, target in list(extra_pairs)[:MAX_EXTRA_PAIRS]:
+        by_base[base].append(target)
+    for base, targets in by_base.items():
+        tasks[f'extra:{base}'] = (
+            lambda base=base, targets=targets: get_live_rates(base, targets),
+            rates_timeout, bulkheads['frankfurter']
+        )
+
+    results, errors = fan_out(tasks)
+
+    ex = results.get('currency_rates')
+    payload = {
+        'currency_rates': ex['quotes'] if ex else None,
+        'base_currency':  ex['source'] if ex else 'USD',
+        'gold_price':     results.get('gold_price'),
+        'partial':        sorted(errors),
+        'errors':         errors
+    }
+    if by_base:
+        payload['extra_rates'] = {
+            f'{base}{target}': results[f'extra:{base}']['quotes'].get(f'{base}{target}')
+            for base, targets in by_base.items() if f'extra:{base}' in results
+            for target in targets
+        }
+    return payload
@@ -1,12 +1,30 @@
-import requests
+import os
 from datetime import date, timedelta
-import pandas as pd
+
+from services.cache import TTLCache
+from services import http_client
+from services.metrics import timed
+
+# Frankfurter publishes once per working day, so a few minutes of staleness is
+# harmless and collapses bursts of identical upstream calls into one.
+rate_cache = TTLCache(
+    maxsize=int(os.getenv('RATE_CACHE_SIZE', 512)),
+    ttl=float(os.getenv('RATE_CACHE_TTL', 300))
+)
+
+def rate_cache_stats():
+    return rate_cache.stats()
 
 # Live & historical rates via frankfurter.app (no key)
+@timed()
 def get_live_rates(source='USD', currencies=None):
     if not currencies:
         currencies = ['EUR','GBP','CAD','JPY','USD']
-    resp = requests.get(
+    key = ('latest', source, tuple(sorted(set(currencies))), None)
+    return rate_cache.get_or_load(key, lambda: _fetch_live_rates(source, currencies))
+
+def _fetch_live_rates(source, currencies):
+    resp = http_client.get(
         'https://api.frankfurter.app/latest',
         params={'from':source,'to':','.join(currencies)}
     )
@@ -21,17 +39,20 @@ def get_live_rates(source='USD', currencies=None):
         'quotes':    quotes
     }
 
+@timed()
 def get_historical_rates(source='USD', currency='EUR', days=7):
     end   = date.today()
     start = end - timedelta(days=days)
-    url   = f'https://api.frankfurter.app/{start.isoformat()}..{end.isoformat()}'
-    resp  = requests.get(url, params={'from':source,'to':currency})
-    data  = resp.json()
-    if 'rates' not in data:
-        raise Exception('Unexpected structure from Frankfurter')
+    key   = ('range', source, (currency,), (start, end))
+    return rate_cache.get_or_load(
+        key, lambda: _fetch_historical_rates(source, currency, start, end)
+    )
+
+def _fetch_historical_rates(source, currency, start, end):
+    raw   = fetch_rate_range(source, [currency], start, end)
     rates = {
         d: {f'{source}{currency}': v[currency]}
-        for d,v in data['rates'].items()
+        for d,v in raw.items()
     }
     return {
         'source':     source,
@@ -41,6 +62,16 @@ def get_historical_rates(source='USD', currency='EUR', days=7):
         'rates':      rates
     }
 
+@timed()
+def fetch_rate_range(source, currencies, start, end):
+    """One Frankfurter call for all `currencies` over [start, end] -> {'YYYY-MM-DD': {currency: rate}}."""
+    url   = f'https://api.frankfurter.app/{start.isoformat()}..{end.isoformat()}'
+    resp  = http_client.get(url, params={'from':source,'to':','.join(currencies)})
+    data  = resp.json()
+    if 'rates' not in data:
+        raise Exception('Unexpected structure from Frankfurter')
+    return data['rates']
+
 def get_margin_info(currency='EUR', source='USD', margin_percent=2.0):
     data = get_live_rates(source=source, currencies=[currency])
     rate = data['quotes'][source+currency]
@@ -53,6 +84,7 @@ def get_margin_info(currency='EUR', source='USD', margin_percent=2.0):
     }
 
 def get_historical_rates_df(source='USD', currency='EUR', days=7):
+    import pandas as pd
     raw = get_historical_rates(source, currency, days)
     records = [
         {'date': d, 'rate': v[f'{source}{currency}']}
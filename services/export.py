@@ -0,0 +1,136 @@
+import io
+import os
+import gzip
+from datetime import timedelta
+
+from model import db
+from model.transaction import Transaction
+from model.order import Order
+from model.escrow import Escrow
+from model.rate_history import RateHistory
+
+CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 10000))
+
+# table -> (model, date column for start/end, columns matched by user_id)
+TABLES = {
+    'transactions': (Transaction, Transaction.added_date, [Transaction.user_id]),
+    'orders':       (Order, Order.created_at, [Order.user_id]),
+    'escrows':      (Escrow, Escrow.created_at, [Escrow.buyer_id, Escrow.seller_id]),
+    'rates':        (RateHistory, RateHistory.date, []),
+}
+
+# format -> (mimetype, file extension, needs pyarrow)
+FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet', True),
+    'arrow':   ('application/vnd.apache.arrow.stream', 'arrows', True),
+    'csv':     ('application/gzip', 'csv.gz', False),
+}
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos   = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+
+def export_query(table, start=None, end=None, user_id=None):
+    """SELECT of every column of `table`, filtered and ordered by primary key."""
+    model, date_col, user_cols = TABLES[table]
+    q = db.select(*model.__table__.columns)
+    if start is not None:
+        q = q.where(date_col >= start)
+    if end is not None:
+        q = q.where(date_col < end + timedelta(days=1))      # `end` is inclusive
+    if user_id is not None:
+        q = q.where(db.or_(*(c == user_id for c in user_cols)))
+    return q.order_by(*model.__table__.primary_key.columns)
+
+def iter_row_chunks(query, chunk_size=CHUNK_SIZE):
+    """(column names, rows) per chunk, read through a server-side cursor."""
+    result = db.session.execute(query.execution_options(yield_per=chunk_size))
+    keys = list(result.keys())
+    for rows in result.partitions():
+        yield keys, rows
+
+def arrow_schema(table):
+    import pyarrow as pa
+    model = TABLES[table][0]
+    fields = []
+    for col in model.__table__.columns:
+        kind = col.type.__class__.__name__
+        if kind == 'Integer':
+            typ = pa.int64()
+        elif kind in ('Float', 'Numeric'):
+            typ = pa.float64()
+        elif kind == 'Boolean':
+            typ = pa.bool_()
+        elif kind == 'DateTime':
+            typ = pa.timestamp('us')
+        elif kind == 'Date':
+            typ = pa.date32()
+        else:
+            typ = pa.string()
+        fields.append(pa.field(col.name, typ, nullable=col.nullable))
+    return pa.schema(fields)
+
+def stream_export(table, fmt, start=None, end=None, user_id=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield the encoded export chunk by chunk.
+
+    Only one chunk of rows (plus the encoder's buffers) is in memory at a
+    time, whatever the size of the result.
+    """
+    query = export_query(table, start, end, user_id)
+    chunks = iter_row_chunks(query, chunk_size)
+    sink = _Sink()
+
+    if fmt == 'csv':
+        import pandas as pd
+        with gzip.GzipFile(fileobj=sink, mode='wb') as gz:
+            header = True
+            for keys, rows in chunks:
+                gz.write(pd.DataFrame(rows, columns=keys).to_csv(index=False, header=header).encode())
+                header = False
+                yield sink.drain()
+            if header:                     # no rows: still send the column names
+                gz.write((','.join(c.name for c in TABLES[table][0].__table__.columns) + '\n').encode())
+        yield sink.drain()
+        return
+
+    import pyarrow as pa
+    schema = arrow_schema(table)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    with writer:
+        for keys, rows in chunks:
+            columns = list(zip(*rows))
+            batch = pa.record_batch(
+                [pa.array(columns[i], type=schema.field(k).type) for i, k in enumerate(keys)],
+                schema=schema
+            )
+            if fmt == 'parquet':
+                writer.write_batch(batch)
+            else:
+                writer.write(batch)
+            yield sink.drain()
+    yield sink.drain()
@@ -1,17 +1,141 @@
-from firebase_config import firestore_db
+import os
+import json
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta
 
-def sync_transaction_to_firestore(transaction):
-    try:
-        doc_data = {
-            "user_id": transaction.user_id,
-            "usd_amount": transaction.usd_amount,
-            "lbp_amount": transaction.lbp_amount,
-            "usd_to_lbp": transaction.usd_to_lbp,
-            "added_date": transaction.added_date.isoformat()
-        }
+from model import db
+from model.firestore_outbox import FirestoreOutbox
+from services.metrics import timed
+
+log = logging.getLogger(__name__)
+
+# Firestore accepts at most 500 writes per batch
+MAX_BATCH = 500
+
+def transaction_document(transaction):
+    return {
+        "user_id": transaction.user_id,
+        "usd_amount": transaction.usd_amount,
+        "lbp_amount": transaction.lbp_amount,
+        "usd_to_lbp": transaction.usd_to_lbp,
+        "added_date": transaction.added_date.isoformat()
+    }
+
+def enqueue_document(collection, doc_data, idempotency_key=None):
+    """Queue a document in the outbox; it is committed with the caller's transaction."""
+    db.session.add(FirestoreOutbox(
+        idempotency_key=idempotency_key or uuid.uuid4().hex,
+        collection=collection,
+        payload=json.dumps(doc_data)
+    ))
+
+def enqueue_transaction(transaction):
+    """Queue a flushed Transaction for Firestore; its id doubles as the document id."""
+    enqueue_document("transactions", transaction_document(transaction),
+                     idempotency_key=f"transaction-{transaction.id}")
 
-        firestore_db.collection("transactions").add(doc_data)
-        print("✅ Transaction synced to Firestore")
+@timed()
+def drain_outbox(client=None, batch_size=MAX_BATCH):
+    """
+    Send one batch of due outbox rows with a single Firestore batched write.
 
+    Each row is written with `set` on a document named after its idempotency
+    key, so a retried batch overwrites instead of duplicating. A failed batch
+    is rescheduled with exponential backoff and marked FAILED after
+    FIRESTORE_SYNC_MAX_ATTEMPTS. Returns the number of documents sent.
+    """
+    if client is None:
+        from firebase_config import firestore_db as client
+    now  = datetime.utcnow()
+    rows = FirestoreOutbox.query.filter(
+        FirestoreOutbox.status == 'PENDING',
+        FirestoreOutbox.next_attempt_at <= now
+    ).order_by(FirestoreOutbox.id).limit(min(batch_size, MAX_BATCH)) \
+     .with_for_update(skip_locked=True).all()
+    if not rows:
+        db.session.commit()
+        return 0
+
+    try:
+        batch = client.batch()
+        for r in rows:
+            ref = client.collection(r.collection).document(r.idempotency_key)
+            batch.set(ref, json.loads(r.payload))
+        batch.commit()
     except Exception as e:
-        print(f"❌ Firestore sync failed: {str(e)}")
+        max_attempts = int(os.getenv('FIRESTORE_SYNC_MAX_ATTEMPTS', 10))
+        base_delay   = float(os.getenv('FIRESTORE_SYNC_BACKOFF', 2))
+        for r in rows:
+            r.attempts += 1
+            r.last_error = str(e)
+            r.next_attempt_at = now + timedelta(seconds=min(base_delay * 2 ** r.attempts, 3600))
+            if r.attempts >= max_attempts:
+                r.status = 'FAILED'
+        db.session.commit()
+        log.warning("Firestore sync of %d documents failed: %s", len(rows), e)
+        return 0
+
+    for r in rows:
+        r.status  = 'SENT'
+        r.sent_at = now
+    db.session.commit()
+    return len(rows)
+
+def start_outbox_worker(app, client=None, interval=None):
+    """Drain the outbox in a daemon thread; full batches are sent back to back."""
+    if interval is None:
+        interval = float(os.getenv('FIRESTORE_SYNC_INTERVAL', 1))
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            sent = 0
+            with app.app_context():
+                try:
+                    sent = drain_outbox(client)
+                except Exception as e:
+                    db.session.rollback()
+                    log.warning("Firestore outbox drain failed: %s", e)
+            if sent < MAX_BATCH:
+                stop.wait(interval)
+
+    threading.Thread(target=loop, name='firestore-outbox', daemon=True).start()
+    return stop
+
+
+class InMemoryFirestore:
+    """Minimal stand-in for the Firestore client (collection/document/batch) for local runs and tests."""
+
+    def __init__(self):
+        self.collections = {}
+        self.commits = 0
+
+    def collection(self, name):
+        return _FakeCollection(self.collections.setdefault(name, {}))
+
+    def batch(self):
+        return _FakeBatch(self)
+
+
+class _FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def document(self, doc_id):
+        return (self.docs, doc_id)
+
+
+class _FakeBatch:
+    def __init__(self, store):
+        self.store  = store
+        self.writes = []
+
+    def set(self, ref, data):
+        self.writes.append((ref, data))
+
+    def commit(self):
+        for (docs, doc_id), data in self.writes:
+            docs[doc_id] = data
+        self.store.commits += 1
@@ -1,49 +1,173 @@
-import yfinance as yf
+import os
+import time
+import logging
+import threading
+from datetime import date, timedelta
 
-def get_gold_price():
-    try:
-        gold = yf.Ticker("GC=F")  # Gold Futures
-        history = gold.history(period="1d")
+from services.http_client import get_upstream
+from services.metrics import timed
 
-        if history is None or history.empty:
-            raise Exception("Gold price history is empty.")
+log = logging.getLogger(__name__)
 
-        price = history['Close'].iloc[-1]
+SYMBOL = "GC=F"  # Gold Futures
 
-        return {
-            "symbol": "GC=F",
-            "currency": "USD",
-            "price": round(price, 2)
-        }
+# Spot price older than this is served once more while a refresh runs in the background
+PRICE_TTL = float(os.getenv('GOLD_PRICE_TTL', 300))
 
+_lock          = threading.Lock()   # guards the state below
+_price_fetch   = threading.Lock()   # one spot-price download at a time
+_history_fetch = threading.Lock()   # one history download at a time
+_price   = None                     # (fetched_at monotonic, price)
+_closes  = {}                       # date -> daily close, grown incrementally
+_covered = None                     # [first, last) date range _closes has been fetched for
+
+def _history(**kwargs):
+    """Ticker history behind the Yahoo breaker and latency histogram (yfinance has its own session)."""
+    import yfinance as yf
+    return get_upstream('yahoo').call(lambda: yf.Ticker(SYMBOL).history(**kwargs))
+
+@timed()
+def get_gold_price():
+    with _lock:
+        cached = _price
+    try:
+        if cached is None:
+            with _price_fetch:
+                if _price is None:
+                    _refresh_price()
+            with _lock:
+                cached = _price
+        elif time.monotonic() - cached[0] > PRICE_TTL:
+            _revalidate(_refresh_price, _price_fetch)
     except Exception as e:
         raise Exception(f"Error fetching gold price: {str(e)}")
 
-from datetime import date, timedelta
+    return {
+        "symbol": SYMBOL,
+        "currency": "USD",
+        "price": cached[1]
+    }
 
+@timed()
 def get_historical_gold_prices(days=7):
-    try:
-        end_date = date.today()
-        start_date = end_date - timedelta(days=days)
+    """
+    Daily closes for the last `days` days, sliced from the shared series.
 
-        gold = yf.Ticker("GC=F")
-        history = gold.history(start=start_date, end=end_date)
+    Only days the series has never covered are downloaded synchronously;
+    when the series just lacks the newest days it is answered as is and
+    extended in the background.
+    """
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days)
+    try:
+        with _lock:
+            covered = _covered
+        if covered is None or start_date < covered[0]:
+            with _history_fetch:
+                _extend_history(start_date, end_date)
+        elif covered[1] < end_date:
+            _revalidate(lambda: _extend_history(start_date, end_date), _history_fetch)
 
-        if history is None or history.empty:
+        with _lock:
+            prices = {
+                str(d): close
+                for d, close in sorted(_closes.items())
+                if start_date <= d < end_date
+            }
+        if not prices:
             raise Exception("No gold price history found.")
+    except Exception as e:
+        raise Exception(f"Error fetching gold history: {str(e)}")
 
-        prices = {
-            str(idx.date()): round(val, 2)
+    return {
+        "symbol": SYMBOL,
+        "currency": "USD",
+        "start_date": str(start_date),
+        "end_date": str(end_date),
+        "prices": prices
+    }
+
+@timed()
+def refresh_gold():
+    """Fetch the spot price and any missing daily closes up to today."""
+    with _price_fetch:
+        _refresh_price()
+    with _lock:
+        covered = _covered
+    if covered is not None:
+        with _history_fetch:
+            _extend_history(covered[0], date.today())
+
+def start_gold_refresh(interval=None):
+    """Run `refresh_gold` in a daemon thread every `interval` seconds (GOLD_REFRESH_INTERVAL)."""
+    if interval is None:
+        interval = float(os.getenv('GOLD_REFRESH_INTERVAL', PRICE_TTL))
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            try:
+                refresh_gold()
+            except Exception as e:
+                log.warning('Gold refresh failed: %s', e)
+            stop.wait(interval)
+
+    threading.Thread(target=loop, name='gold-refresh', daemon=True).start()
+    return stop
+
+# -- internals --
+
+def _refresh_price():
+    history = _history(period="1d")
+    if history is None or history.empty:
+        raise Exception("Gold price history is empty.")
+    price = round(float(history['Close'].iloc[-1]), 2)
+    global _price
+    with _lock:
+        _price = (time.monotonic(), price)
+
+def _extend_history(start, end):
+    """Download only the parts of [start, end) the series does not cover yet."""
+    global _covered
+    with _lock:
+        covered = _covered
+    if covered is None:
+        missing = [(start, end)]
+    else:
+        missing = []
+        if start < covered[0]:
+            missing.append((start, covered[0]))
+        if covered[1] < end:
+            missing.append((covered[1], end))
+
+    for lo, hi in missing:
+        history = _history(start=lo, end=hi)
+        closes = {} if history is None or history.empty else {
+            idx.date(): round(float(val), 2)
             for idx, val in history["Close"].items()
         }
+        if not closes:
+            # yfinance reports a failed download as an empty frame; leave the
+            # range uncovered so the next read asks for it again
+            continue
+        # covered only up to the latest close returned, not the requested end
+        last = max(closes) + timedelta(days=1)
+        with _lock:
+            _closes.update(closes)
+            _covered = (lo, last) if _covered is None else \
+                       (min(_covered[0], lo), max(_covered[1], last))
 
-        return {
-            "symbol": "GC=F",
-            "currency": "USD",
-            "start_date": str(start_date),
-            "end_date": str(end_date),
-            "prices": prices
-        }
+def _revalidate(refresh, fetch_lock):
+    """Run `refresh` in the background unless a fetch of the same kind is already running."""
+    if not fetch_lock.acquire(blocking=False):
+        return
 
-    except Exception as e:
-        raise Exception(f"Error fetching gold history: {str(e)}")
+    def run():
+        try:
+            refresh()
+        except Exception as e:
+            log.warning('Gold refresh failed: %s', e)
+        finally:
+            fetch_lock.release()
+
+    threading.Thread(target=run, name='gold-revalidate', daemon=True).start()
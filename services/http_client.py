@@ -0,0 +1,143 @@
+import os
+import time
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from services.metrics import LatencyHistogram, histogram_lines
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive errors and rejects calls for
+    `reset_after` seconds. Then one trial call is let through (half-open):
+    a success closes the breaker again, a failure re-opens it.
+    """
+
+    def __init__(self, failures=5, reset_after=30):
+        self.failures    = failures
+        self.reset_after = reset_after
+        self.state       = 'closed'
+        self.total_failures = 0
+        self._errors     = 0
+        self._opened_at  = 0.0
+        self._lock       = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state = 'half-open'
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state, self._errors = 'closed', 0
+
+    def record_failure(self):
+        with self._lock:
+            self._errors += 1
+            self.total_failures += 1
+            if self.state == 'half-open' or self._errors >= self.failures:
+                self.state, self._opened_at = 'open', time.monotonic()
+
+
+class Upstream:
+    """A keep-alive session, breaker and latency histogram for one upstream host."""
+
+    def __init__(self, name):
+        self.name    = name
+        self.timeout = (float(os.getenv('HTTP_CONNECT_TIMEOUT', 3)),
+                        float(os.getenv('HTTP_READ_TIMEOUT', 10)))
+        self.breaker = CircuitBreaker(
+            failures=int(os.getenv('HTTP_BREAKER_FAILURES', 5)),
+            reset_after=float(os.getenv('HTTP_BREAKER_RESET', 30))
+        )
+        self.latency = LatencyHistogram()
+
+        retry = Retry(
+            total=int(os.getenv('HTTP_RETRIES', 2)),
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET', 'HEAD'})
+        )
+        pool = int(os.getenv('HTTP_POOL_SIZE', 10))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def call(self, fn, *args, **kwargs):
+        """Run `fn` behind this upstream's breaker and record its latency."""
+        if not self.breaker.allow():
+            raise CircuitOpen(f'{self.name} is unavailable (circuit open)')
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+        self.breaker.record_success()
+        return result
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+
+        def send():
+            resp = self.session.request(method, url, **kwargs)
+            if resp.status_code >= 500:
+                resp.raise_for_status()
+            return resp
+        return self.call(send)
+
+    def stats(self):
+        return {'state': self.breaker.state, 'errors': self.breaker.total_failures,
+                'latency': self.latency.snapshot()}
+
+
+_upstreams = {}
+_lock = threading.Lock()
+
+def get_upstream(name):
+    with _lock:
+        if name not in _upstreams:
+            _upstreams[name] = Upstream(name)
+        return _upstreams[name]
+
+def get(url, upstream=None, **kwargs):
+    """requests.get through the pooled session of the URL's host (or `upstream`)."""
+    return get_upstream(upstream or urlsplit(url).hostname).request('GET', url, **kwargs)
+
+def upstream_stats():
+    with _lock:
+        upstreams = dict(_upstreams)
+    return {name: u.stats() for name, u in upstreams.items()}
+
+def upstream_metrics():
+    """Prometheus lines for every upstream's latency, failures and breaker state."""
+    with _lock:
+        upstreams = sorted(_upstreams.items())
+    lines = ['# HELP upstream_request_duration_seconds Outbound call latency, retries included',
+             '# TYPE upstream_request_duration_seconds histogram']
+    lines += histogram_lines('upstream_request_duration_seconds', ('upstream',),
+                             [((name,), u.latency) for name, u in upstreams])
+    lines += ['# HELP upstream_failures_total Outbound calls that failed after retries',
+              '# TYPE upstream_failures_total counter']
+    lines += [f'upstream_failures_total{{upstream="{name}"}} {u.breaker.total_failures}'
+              for name, u in upstreams]
+    lines += ['# HELP upstream_circuit_open 1 while the circuit breaker is open or half-open',
+              '# TYPE upstream_circuit_open gauge']
+    lines += [f'upstream_circuit_open{{upstream="{name}"}} {int(u.breaker.state != "closed")}'
+              for name, u in upstreams]
+    return lines
@@ -0,0 +1,100 @@
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_EVEN
+from sqlalchemy.exc import IntegrityError
+
+from model import db
+from model.wallet import WalletBalance
+from model.ledger import LedgerEntry
+from model.escrow import Escrow
+
+# Wallet movements. Every change is an append to ledger_entries plus an
+# in-SQL increment of the materialized WalletBalance, so concurrent requests
+# can never overwrite each other's balance. Callers own the commit.
+
+QUANTUM = Decimal('0.00000001')
+
+class InsufficientFunds(Exception):
+    pass
+
+def to_amount(value):
+    """Decimal rounded to the ledger's 8 places (floats go through str to avoid binary noise)."""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(QUANTUM, rounding=ROUND_HALF_EVEN)
+
+def balance_of(user_id, currency):
+    w = WalletBalance.query.filter_by(user_id=user_id, currency=currency).first()
+    return to_amount(w.balance) if w else to_amount(0)
+
+def credit(user_id, currency, amount, entry_type, ref_id=None):
+    amt = to_amount(amount)
+    _add_to_wallet(user_id, currency, amt)
+    db.session.add(LedgerEntry(user_id=user_id, currency=currency, amount=amt,
+                               entry_type=entry_type, ref_id=ref_id))
+
+def debit(user_id, currency, amount, entry_type, ref_id=None):
+    """Atomically take `amount` out of the wallet; raises InsufficientFunds instead of going negative."""
+    amt = to_amount(amount)
+    updated = WalletBalance.query.filter(
+        WalletBalance.user_id == user_id,
+        WalletBalance.currency == currency,
+        WalletBalance.balance >= amt
+    ).update({WalletBalance.balance: WalletBalance.balance - amt},
+             synchronize_session=False)
+    if not updated:
+        raise InsufficientFunds(f'Insufficient {currency} balance')
+    db.session.add(LedgerEntry(user_id=user_id, currency=currency, amount=-amt,
+                               entry_type=entry_type, ref_id=ref_id))
+
+def release_escrows(escrow_ids, seller_id):
+    """
+    Release many PENDING escrows owned by `seller_id` in one DB transaction.
+
+    The escrow rows are locked, flipped with a single UPDATE, and the buyer
+    credits are summed per wallet so each wallet gets one increment.
+    Returns the ids that were released (the caller commits).
+    """
+    rows = Escrow.query.filter(
+        Escrow.id.in_(escrow_ids),
+        Escrow.seller_id == seller_id,
+        Escrow.status == 'PENDING'
+    ).with_for_update().all()
+    if not rows:
+        return []
+
+    ids = [e.id for e in rows]
+    Escrow.query.filter(Escrow.id.in_(ids), Escrow.status == 'PENDING') \
+        .update({'status': 'RELEASED'}, synchronize_session=False)
+
+    totals = defaultdict(Decimal)
+    for e in rows:
+        amt = to_amount(to_amount(e.amount) * to_amount(e.price))
+        totals[(e.buyer_id, e.target_currency)] += amt
+        db.session.add(LedgerEntry(user_id=e.buyer_id, currency=e.target_currency,
+                                   amount=amt, entry_type='ESCROW_RELEASE', ref_id=e.id))
+    for (user_id, currency), amt in totals.items():
+        _add_to_wallet(user_id, currency, amt)
+    # imported here: candles pulls in model.transaction, whose schema would
+    # configure the mappers before model.user is loaded by importers of the ledger
+    from services.candles import candles_enabled, record_trades, escrow_trades
+    if candles_enabled():
+        record_trades(escrow_trades(rows))
+    return ids
+
+def _add_to_wallet(user_id, currency, amt):
+    """`balance = balance + amt`, creating the wallet row on first use."""
+    for _ in range(2):
+        updated = WalletBalance.query.filter_by(user_id=user_id, currency=currency).update(
+            {WalletBalance.balance: WalletBalance.balance + amt},
+            synchronize_session=False
+        )
+        if updated:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(WalletBalance(user_id=user_id, currency=currency, balance=amt))
+            return
+        except IntegrityError:
+            # the wallet was created concurrently; increment it instead
+            continue
+    raise RuntimeError(f'Could not update {currency} wallet of user {user_id}')
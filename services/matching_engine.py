@@ -0,0 +1,245 @@
+import heapq
+import itertools
+import threading
+from collections import namedtuple
+
+from model import db
+from model.order import Order
+from model.escrow import Escrow
+from services.ledger import balance_of, debit
+
+# Amounts are floats in the DB; anything below this is treated as filled
+EPS = 1e-9
+# Rematches allowed when a maker turns out to be taken already (see StaleFill)
+MAX_ATTEMPTS = 3
+
+Fill = namedtuple('Fill', 'maker_order_id maker_user_id amount price')
+
+
+class StaleFill(Exception):
+    """A maker was claimed or shrunk outside the book; the match must be redone."""
+
+
+class BookConflict(Exception):
+    """The order kept matching stale makers and was not placed."""
+
+
+class _Resting:
+    __slots__ = ('order_id', 'user_id', 'price', 'amount', 'live')
+
+    def __init__(self, order_id, user_id, price, amount):
+        self.order_id = order_id
+        self.user_id  = user_id
+        self.price    = price
+        self.amount   = amount
+        self.live     = True
+
+
+class OrderBook:
+    """
+    Price-time priority book for one (base, target) pair.
+
+    Bids and asks are binary heaps keyed on (price, arrival sequence), so the
+    best resting order is always at the top. Cancelled or filled orders are
+    dropped lazily when they reach the top. Pure in-memory: no DB access.
+    """
+
+    def __init__(self):
+        self.bids    = []      # (-price, seq, _Resting)
+        self.asks    = []      # ( price, seq, _Resting)
+        self.orders  = {}      # order_id -> _Resting
+        self.high_water = 0    # newest order id ever rested here
+        self._seq    = itertools.count()
+
+    def add(self, order_id, user_id, side, price, amount):
+        """Rest an order on its side without matching it."""
+        entry = _Resting(order_id, user_id, price, amount)
+        self.orders[order_id] = entry
+        self.high_water = max(self.high_water, order_id)
+        if side == 'BUY':
+            heapq.heappush(self.bids, (-price, next(self._seq), entry))
+        else:
+            heapq.heappush(self.asks, (price, next(self._seq), entry))
+
+    def cancel(self, order_id):
+        entry = self.orders.pop(order_id, None)
+        if entry is not None:
+            entry.live = False
+
+    def submit(self, order_id, user_id, side, price, amount, max_fill=None):
+        """
+        Match an incoming limit order, then rest whatever is left.
+
+        `max_fill` caps the total amount the taker may fill (e.g. its wallet
+        balance). Orders from the same user are never matched together.
+        Returns (fills, remaining).
+        """
+        fills, remaining = self.match(user_id, side, price, amount, max_fill)
+        if remaining > EPS:
+            self.add(order_id, user_id, side, price, remaining)
+        return fills, remaining
+
+    def match(self, user_id, side, price, amount, max_fill=None):
+        book = self.asks if side == 'BUY' else self.bids
+        budget = amount if max_fill is None else min(amount, max_fill)
+        remaining, fills, own = amount, [], []
+
+        while budget > EPS and book:
+            top = book[0]
+            entry = top[2]
+            if not entry.live:
+                heapq.heappop(book)
+                continue
+            if (side == 'BUY' and entry.price > price) or \
+               (side == 'SELL' and entry.price < price):
+                break
+            if entry.user_id == user_id:
+                own.append(heapq.heappop(book))
+                continue
+
+            qty = min(budget, entry.amount)
+            fills.append(Fill(entry.order_id, entry.user_id, qty, entry.price))
+            entry.amount -= qty
+            remaining -= qty
+            budget -= qty
+            if entry.amount <= EPS:
+                entry.live = False
+                heapq.heappop(book)
+                self.orders.pop(entry.order_id, None)
+
+        for item in own:
+            heapq.heappush(book, item)
+        return fills, remaining
+
+
+class MatchingEngine:
+    """
+    One OrderBook per (base_currency, target_currency), rebuilt from the OPEN
+    orders in the DB on first use.
+
+    A fill behaves like accepting the resting order for that amount: the
+    taker's base-currency wallet is debited, the maker order's open amount
+    shrinks (COMPLETED at zero) and a PENDING Escrow row is created.
+    The books live in this process, so order submission should be served
+    by a single worker. Other writers are tolerated: a pair's book is
+    reloaded when the DB holds an OPEN order newer than any the book has
+    seen, and maker rows are only ever shrunk with a conditional UPDATE, so
+    a fill against an order taken elsewhere is dropped and the match redone
+    against the reloaded book instead of overfilling it.
+    """
+
+    def __init__(self):
+        self.books  = {}
+        self._locks = {}
+        self._lock  = threading.Lock()
+        self._loaded = False
+
+    def load(self, skip_id=None):
+        with self._lock:
+            self.books.clear()
+            for o in Order.query.filter(Order.status == 'OPEN', Order.id != skip_id) \
+                                .order_by(Order.created_at, Order.id):
+                self._book(o.base_currency, o.target_currency) \
+                    .add(o.id, o.user_id, o.type, o.price, o.amount)
+            self._loaded = True
+
+    def cancel(self, order):
+        with self.pair_lock(order.base_currency, order.target_currency):
+            self._book(order.base_currency, order.target_currency).cancel(order.id)
+
+    def submit(self, order):
+        """Match a new (flushed, uncommitted) Order row, persist the fills and commit."""
+        if not self._loaded:
+            self.load(skip_id=order.id)
+        base, target = order.base_currency, order.target_currency
+        with self.pair_lock(base, target):
+            try:
+                # orders rested by another worker since this book was built
+                newest = db.session.query(db.func.max(Order.id)).filter(
+                    Order.status == 'OPEN', Order.id != order.id,
+                    Order.base_currency == base, Order.target_currency == target
+                ).scalar()
+                if newest is not None and newest > self._book(base, target).high_water:
+                    self._reload_pair(base, target, skip_id=order.id)
+                for _ in range(MAX_ATTEMPTS):
+                    available = float(balance_of(order.user_id, base))
+                    fills, remaining = self._book(base, target).submit(
+                        order.id, order.user_id, order.type,
+                        order.price, order.amount, max_fill=available)
+                    try:
+                        with db.session.begin_nested():
+                            escrows = self._persist(order, fills, remaining)
+                        break
+                    except StaleFill:
+                        self._reload_pair(base, target, skip_id=order.id)
+                else:
+                    raise BookConflict('Order book changed while matching, try again')
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self._reload_pair(base, target)
+                raise
+        return [
+            {'escrow_id': e.id, 'maker_order_id': f.maker_order_id,
+             'amount': f.amount, 'price': f.price}
+            for f, e in zip(fills, escrows)
+        ]
+
+    def _persist(self, order, fills, remaining):
+        escrows = []
+        if not fills:
+            return escrows
+        for f in fills:
+            # only shrink a maker that is still open with enough left; the
+            # book may be behind a concurrent accept_order or another worker
+            shrunk = Order.query.filter(
+                Order.id == f.maker_order_id,
+                Order.status == 'OPEN',
+                Order.amount >= f.amount - EPS
+            ).update({Order.amount: Order.amount - f.amount}, synchronize_session=False)
+            if not shrunk:
+                raise StaleFill(f.maker_order_id)
+            e = Escrow(
+                order_id=f.maker_order_id,
+                buyer_id=order.user_id,
+                seller_id=f.maker_user_id,
+                amount=f.amount,
+                price=f.price,
+                target_currency=order.target_currency
+            )
+            db.session.add(e)
+            escrows.append(e)
+        Order.query.filter(
+            Order.id.in_({f.maker_order_id for f in fills}),
+            Order.amount <= EPS
+        ).update({Order.amount: 0.0, Order.status: 'COMPLETED'}, synchronize_session=False)
+        # conditional SQL debit: raises InsufficientFunds if a concurrent
+        # request spent the balance since it was read
+        debit(order.user_id, order.base_currency, sum(f.amount for f in fills),
+              'ESCROW_HOLD', ref_id=order.id)
+        order.amount = max(remaining, 0.0)
+        if order.amount <= EPS:
+            order.status = 'COMPLETED'
+        return escrows
+
+    def _reload_pair(self, base, target, skip_id=None):
+        book = self.books[(base, target)] = OrderBook()
+        for o in Order.query.filter(Order.status == 'OPEN', Order.id != skip_id,
+                                    Order.base_currency == base,
+                                    Order.target_currency == target) \
+                            .order_by(Order.created_at, Order.id):
+            book.add(o.id, o.user_id, o.type, o.price, o.amount)
+
+    def _book(self, base, target):
+        key = (base, target)
+        if key not in self.books:
+            self.books[key] = OrderBook()
+        return self.books[key]
+
+    def pair_lock(self, base, target):
+        """Serializes matching on a pair; reentrant so holders may still call cancel()."""
+        with self._lock:
+            return self._locks.setdefault((base, target), threading.RLock())
+
+
+matching_engine = MatchingEngine()
@@ -0,0 +1,298 @@
+import os
+import hmac
+import glob
+import time
+import logging
+import threading
+from bisect import bisect_left
+from functools import wraps
+from contextlib import contextmanager
+
+from flask import g, jsonify, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+# In-process instrumentation: per-route and per-span latency histograms,
+# SQL timings, and the cache/upstream counters other services already keep,
+# rendered in the Prometheus text format by /metrics.
+
+
+class LatencyHistogram:
+    """Cumulative latency buckets (seconds), Prometheus style."""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)   # last slot is +Inf
+        self._sum    = 0.0
+        self._lock   = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._counts[bisect_left(self.buckets, seconds)] += 1
+            self._sum += seconds
+
+    def snapshot(self):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = {}, 0
+        for le, n in zip(self.buckets + ('+Inf',), counts):
+            running += n
+            cumulative[str(le)] = running
+        return {'count': running, 'sum': round(total, 6), 'buckets': cumulative}
+
+
+class HistogramFamily:
+    """One LatencyHistogram per label combination."""
+
+    def __init__(self, name, help, labelnames):
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames)
+        self._children  = {}
+        self._lock      = threading.Lock()
+
+    def observe(self, labels, seconds):
+        hist = self._children.get(labels)
+        if hist is None:
+            with self._lock:
+                hist = self._children.setdefault(labels, LatencyHistogram())
+        hist.observe(seconds)
+
+    def items(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class CounterFamily:
+    def __init__(self, name, help, labelnames):
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames)
+        self._values    = {}
+        self._lock      = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+request_latency = HistogramFamily('http_request_duration_seconds',
+                                  'Time to first byte of Flask responses',
+                                  ('method', 'endpoint', 'status'))
+span_latency    = HistogramFamily('service_span_duration_seconds',
+                                  'Duration of instrumented service calls', ('span',))
+span_errors     = CounterFamily('service_span_errors_total',
+                                'Instrumented service calls that raised', ('span',))
+query_latency   = HistogramFamily('db_query_duration_seconds',
+                                  'SQL statement execution time', ('operation',))
+
+# name -> callable returning TTLCache.stats()-shaped dicts, registered by the app
+_caches = {}
+_collectors = []
+
+
+def register_cache(name, stats):
+    _caches[name] = stats
+
+def register_collector(collect):
+    """`collect()` returns extra exposition lines (e.g. upstream breaker state)."""
+    _collectors.append(collect)
+    return collect
+
+
+# ---- spans ----
+@contextmanager
+def span(name):
+    """Time the enclosed block as `name`; inside a profiled request it is also listed in Server-Timing."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        span_errors.inc((name,))
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        span_latency.observe((name,), elapsed)
+        if has_request_context() and g.get('_profile') is not None:
+            g._profile['spans'].append((name, elapsed))
+
+def timed(name=None):
+    """Decorator form of span(); the default name is `module.function` without the package."""
+    def decorate(fn):
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ---- SQL ----
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_query(conn, cursor, statement, parameters, context, executemany):
+    # kept on the per-statement context, so a statement that fails (and
+    # never reaches after_cursor_execute) leaves nothing behind
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_query(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_query_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+    query_latency.observe((operation,), elapsed)
+    if has_request_context() and g.get('_profile') is not None:
+        g._profile['queries'] += 1
+        g._profile['query_time'] += elapsed
+
+
+# ---- Flask ----
+def profiling_enabled():
+    return os.getenv('METRICS_PROFILE', '0').lower() in ('1', 'true', 'yes')
+
+def api_key_ok(headers, required=False):
+    """
+    Whether the request carries METRICS_API_KEY (as X-API-Key or a Bearer token).
+
+    Without a configured key this is True unless `required` (profiling is
+    never open to anonymous callers).
+    """
+    key = os.getenv('METRICS_API_KEY')
+    if not key:
+        return not required
+    given = headers.get('X-API-Key', '')
+    auth = headers.get('Authorization', '')
+    if not given and auth.startswith('Bearer '):
+        given = auth[len('Bearer '):]
+    return hmac.compare_digest(given, key)
+
+def api_key_required(fn):
+    """Answer 403 unless `api_key_ok`; for /metrics and the operational stats routes."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not api_key_ok(request.headers):
+            return jsonify({'error': 'Invalid API key'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+def init_app(app):
+    """
+    Time every request by route template (bounded label set) and, when
+    METRICS_PROFILE is on, profile requests sent with `?profile=1` and the
+    METRICS_API_KEY.
+
+    Profiled requests are run under cProfile; the stats are dumped to
+    METRICS_PROFILE_DIR (only the newest METRICS_PROFILE_MAX_FILES are
+    kept) and the response carries the dump path and a Server-Timing
+    header with the spans and SQL time of that request.
+    Streamed responses are timed up to their first byte.
+    """
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+        if profiling_enabled() and request.args.get('profile') == '1' \
+                and api_key_ok(request.headers, required=True):
+            import cProfile
+            g._profile = {'profiler': cProfile.Profile(), 'spans': [],
+                          'queries': 0, 'query_time': 0.0}
+            g._profile['profiler'].enable()
+
+    @app.after_request
+    def _record(response):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_latency.observe((request.method, endpoint, str(response.status_code)), elapsed)
+
+        profile = g.pop('_profile', None)
+        if profile is not None:
+            profile['profiler'].disable()
+            path = _dump_profile(profile['profiler'], request.endpoint or 'unmatched')
+            timings = [f'total;dur={elapsed * 1000:.1f}',
+                       f'db;desc="{profile["queries"]} queries";dur={profile["query_time"] * 1000:.1f}']
+            timings += [f'{name.replace(".", "-")};dur={t * 1000:.1f}' for name, t in profile['spans']]
+            response.headers['Server-Timing'] = ', '.join(timings)
+            response.headers['X-Profile-Dump'] = path
+        return response
+
+def _dump_profile(profiler, endpoint):
+    out_dir = os.getenv('METRICS_PROFILE_DIR', 'profiles')
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f'{endpoint}-{time.strftime("%Y%m%d-%H%M%S")}-{time.time_ns() % 10**6:06d}.prof')
+    profiler.dump_stats(path)
+    log.info('Request profile written to %s', path)
+
+    keep = int(os.getenv('METRICS_PROFILE_MAX_FILES', 50))
+    dumps = sorted(glob.glob(os.path.join(out_dir, '*.prof')), key=os.path.getmtime)
+    for old in dumps[:max(len(dumps) - keep, 0)]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return path
+
+
+# ---- exposition ----
+def _labels(names, values):
+    pairs = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(names, values))
+    return '{' + pairs + '}' if pairs else ''
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def histogram_lines(name, labelnames, items):
+    """Exposition lines for (label values, LatencyHistogram) pairs."""
+    lines = []
+    for values, hist in items:
+        snap = hist.snapshot()
+        for le, count in snap['buckets'].items():
+            lines.append(f'{name}_bucket{_labels(labelnames + ("le",), values + (le,))} {count}')
+        lines.append(f'{name}_sum{_labels(labelnames, values)} {snap["sum"]}')
+        lines.append(f'{name}_count{_labels(labelnames, values)} {snap["count"]}')
+    return lines
+
+def render_prometheus():
+    lines = []
+    for family in (request_latency, span_latency, query_latency):
+        lines += [f'# HELP {family.name} {family.help}', f'# TYPE {family.name} histogram']
+        lines += histogram_lines(family.name, family.labelnames, family.items())
+
+    lines += [f'# HELP {span_errors.name} {span_errors.help}', f'# TYPE {span_errors.name} counter']
+    lines += [f'{span_errors.name}{_labels(span_errors.labelnames, k)} {v}' for k, v in span_errors.items()]
+
+    cache_stats = {}
+    for name, stats in list(_caches.items()):
+        try:
+            cache_stats[name] = stats()
+        except Exception as e:
+            log.warning('Cache stats for %s failed: %s', name, e)
+    for field, kind, help in (('hits', 'counter', 'Cache lookups served from memory'),
+                              ('misses', 'counter', 'Cache lookups that ran the loader'),
+                              ('coalesced', 'counter', 'Lookups that waited on an in-flight load'),
+                              ('evictions', 'counter', 'Entries evicted to stay under maxsize'),
+                              ('size', 'gauge', 'Entries currently cached')):
+        metric = f'cache_{field}_total' if kind == 'counter' else f'cache_{field}'
+        lines += [f'# HELP {metric} {help}', f'# TYPE {metric} {kind}']
+        lines += [f'{metric}{{cache="{name}"}} {s[field]}' for name, s in cache_stats.items()]
+
+    for collect in list(_collectors):
+        try:
+            lines += collect()
+        except Exception as e:
+            log.warning('Metrics collector %s failed: %s', getattr(collect, '__name__', collect), e)
+    return '\n'.join(lines) + '\n'
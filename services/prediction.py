@@ -1,43 +1,235 @@
-import pandas as pd
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-from services.exchange_api import get_historical_rates_df
+import os
+import threading
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+from services.cache import TTLCache
+from services.rate_store import get_history_df, get_history_frames
+from services.metrics import timed
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Finished forecast frames, keyed by (source, currency, history_days,
+# forecast_days, last data date): unchanged history never refits.
+_forecast_cache = TTLCache(
+    maxsize=int(os.getenv('FORECAST_CACHE_SIZE', 256)),
+    ttl=float(os.getenv('FORECAST_CACHE_TTL', 86400))
+)
+# Last fitted parameters per (source, currency, history_days), used as the
+# optimizer's starting point once a new day of data shifts the window.
+_params_cache = TTLCache(
+    maxsize=int(os.getenv('FORECAST_CACHE_SIZE', 256)),
+    ttl=float(os.getenv('FORECAST_PARAMS_TTL', 7 * 86400))
+)
+_fit_lock   = threading.Lock()
+_fit_counts = {'cold_fits': 0, 'warm_fits': 0}
+
+_pool      = None
+_pool_lock = threading.Lock()
+
+# Most pairs one /predict-batch request may ask for (each miss is a model fit)
+MAX_BATCH_PAIRS = int(os.getenv('FORECAST_MAX_BATCH_PAIRS', 20))
+
+def forecast_cache_stats():
+    with _fit_lock:
+        counts = dict(_fit_counts)
+    return dict(counts, forecasts=_forecast_cache.stats(), params=_params_cache.stats())
+
+def trade_suggestion(last_rate, next_rate):
+    return 'BUY' if next_rate > last_rate else 'SELL' if next_rate < last_rate else 'HOLD'
+
+def fit_holt_winters(series, forecast_days, start_params=None):
+    """
+    Fit an additive-trend Holt–Winters model and forecast `forecast_days`.
+
+    With `start_params` ([alpha, beta, level, trend] from a previous fit) the
+    optimizer starts there and skips the brute-force grid search.
+    Returns (forecast Series, fitted params array).
+    """
+    fc, params, warm = _fit(series, forecast_days, start_params)
+    _count_fit(warm)
+    return fc, params
+
+@timed()
 def forecast_rates_hw(
     source: str = "USD",
     currency: str = "EUR",
     history_days: int = 30,
-    forecast_days: int = 7
-) -> pd.DataFrame:
+    forecast_days: int = 7,
+    history: "pd.DataFrame" = None
+) -> "pd.DataFrame":
     """
-    1) Fetch last `history_days` rates as a DataFrame
-    2) Fit a Holt–Winters exponential smoothing model (additive trend)
+    1) Read last `history_days` rates from the local rate store
+       (or use `history` when the caller already loaded it)
+    2) Fit a Holt–Winters exponential smoothing model (additive trend),
+       warm-started from the previous fit of the same window
     3) Forecast the next `forecast_days`
     4) Return a DataFrame with columns ['date','yhat','yhat_lower','yhat_upper']
        (we set lower=upper=yhat since this method doesn’t output CIs)
+    Results are memoized until the history gains a new day.
     """
     # 1) Pull the history
-    df = get_historical_rates_df(
+    df = history if history is not None else get_history_df(
         source=source,
         currency=currency,
         days=history_days
     )
 
-    # 2) Prepare series (date → index)
-    df = df.set_index("date")
-    series = df["rate"].astype(float)
+    key = _forecast_key(source, currency, history_days, forecast_days, df)
+    df_fc = _forecast_cache.get_or_load(
+        key, lambda: _build_forecast(df, source, currency, history_days, forecast_days)
+    )
+    # callers reformat columns in place; keep the cached frame pristine
+    return df_fc.copy()
+
+@timed()
+def forecast_many(pairs, history_days=30, forecast_days=7):
+    """
+    Forecast several (source, currency) pairs in one go.
+
+    Histories are loaded with one store read (and at most one Frankfurter
+    call) per base currency; cache misses are fitted in parallel in a
+    process pool. Returns (results, errors) where each result carries the
+    forecast records and a BUY/SELL/HOLD suggestion.
+    """
+    by_source = defaultdict(list)
+    for src, cur in pairs:
+        if cur not in by_source[src]:
+            by_source[src].append(cur)
+
+    histories, errors = {}, []
+    for src, curs in by_source.items():
+        try:
+            for cur, df in get_history_frames(src, curs, history_days).items():
+                histories[(src, cur)] = df
+        except Exception as e:
+            errors.extend({'source': src, 'currency': cur, 'error': str(e)} for cur in curs)
+
+    frames, pending = {}, {}
+    for pair, df in histories.items():
+        if len(df) < 2:
+            errors.append({'source': pair[0], 'currency': pair[1], 'error': 'Not enough history'})
+            continue
+        key = _forecast_key(pair[0], pair[1], history_days, forecast_days, df)
+        cached = _forecast_cache.get(key)
+        if cached is not None:
+            frames[pair] = cached
+        else:
+            pending[pair] = key
+
+    if pending:
+        jobs = {
+            pair: (
+                histories[pair].set_index("date")["rate"].astype(float),
+                forecast_days,
+                _params_cache.get((pair[0], pair[1], history_days))
+            )
+            for pair in pending
+        }
+        for pair, outcome in _run_fits(jobs).items():
+            if isinstance(outcome, Exception):
+                errors.append({'source': pair[0], 'currency': pair[1], 'error': str(outcome)})
+                continue
+            fc, params, warm = outcome
+            _count_fit(warm)
+            _params_cache.set((pair[0], pair[1], history_days), params)
+            frames[pair] = _forecast_frame(fc)
+            _forecast_cache.set(pending[pair], frames[pair])
+
+    results = []
+    for src, cur in pairs:
+        df_fc = frames.get((src, cur))
+        if df_fc is None:
+            continue
+        last = histories[(src, cur)]['rate'].iloc[-1]
+        results.append({
+            'source':     src,
+            'currency':   cur,
+            'suggestion': trade_suggestion(last, df_fc['yhat'].iloc[0]),
+            'data':       df_fc.to_dict('records')
+        })
+    return results, errors
+
+# -- internals --
+
+def _fit(series, forecast_days, start_params=None):
+    import numpy as np
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
 
-    # 3) Fit Holt–Winters (additive trend, no seasonality)
     model = ExponentialSmoothing(series, trend="add", seasonal=None)
-    fit = model.fit(optimized=True)
+    fit = None
+    if start_params is not None:
+        try:
+            fit = model.fit(optimized=True, start_params=start_params, use_brute=False)
+        except Exception:
+            fit = None
+    warm = fit is not None
+    if fit is None:
+        fit = model.fit(optimized=True)
+
+    p = fit.params
+    params = np.array([p['smoothing_level'], p['smoothing_trend'],
+                       p['initial_level'], p['initial_trend']], dtype=float)
+    # keep the smoothing terms strictly inside their bounds for the next start
+    params[:2] = np.clip(params[:2], 1e-4, 1 - 1e-4)
+    return fit.forecast(forecast_days), params, warm
+
+def _count_fit(warm):
+    with _fit_lock:
+        _fit_counts['warm_fits' if warm else 'cold_fits'] += 1
+
+def _run_fits(jobs):
+    """Fit {pair: (series, forecast_days, start_params)}; in-process for a single job."""
+    if len(jobs) == 1:
+        pair, args = next(iter(jobs.items()))
+        try:
+            return {pair: _fit(*args)}
+        except Exception as e:
+            return {pair: e}
 
-    # 4) Forecast out-of-sample
-    fc = fit.forecast(forecast_days)
+    futures = {pair: _get_pool().submit(_fit, *args) for pair, args in jobs.items()}
+    out = {}
+    for pair, fut in futures.items():
+        try:
+            out[pair] = fut.result()
+        except Exception as e:
+            out[pair] = e
+    return out
 
-    # 5) Build result DataFrame
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = int(os.getenv('FORECAST_WORKERS', os.cpu_count() or 1))
+            # spawn, not fork: this process runs threads (outbox, gold refresh,
+            # rate stream...) and a forked child could inherit a held lock
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+def _forecast_key(source, currency, history_days, forecast_days, df):
+    last_date = df["date"].iloc[-1] if not df.empty else None
+    return (source, currency, history_days, forecast_days, last_date)
+
+def _forecast_frame(fc):
     df_fc = fc.reset_index()
     df_fc.columns = ["date", "yhat"]
     df_fc["yhat_lower"] = df_fc["yhat"]
     df_fc["yhat_upper"] = df_fc["yhat"]
     df_fc["date"] = df_fc["date"].dt.strftime("%Y-%m-%d")
-
     return df_fc
+
+def _build_forecast(df, source, currency, history_days, forecast_days):
+    # 2) Prepare series (date → index)
+    df = df.set_index("date")
+    series = df["rate"].astype(float)
+
+    # 3) Fit Holt–Winters and forecast out-of-sample
+    params_key = (source, currency, history_days)
+    fc, params = fit_holt_winters(series, forecast_days, _params_cache.get(params_key))
+    _params_cache.set(params_key, params)
+
+    # 4) Build result DataFrame
+    return _forecast_frame(fc)
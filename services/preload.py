@@ -0,0 +1,44 @@
+import os
+import time
+import logging
+import importlib
+
+log = logging.getLogger(__name__)
+
+# Heavy optional subsystems and the modules that pull them in. The services
+# import these on first use; list them in PRELOAD_SUBSYSTEMS (comma-separated,
+# or "all") to pay the cost at startup instead of on the first request.
+SUBSYSTEMS = {
+    'pandas':      ['pandas'],
+    'forecast':    ['pandas', 'statsmodels.tsa.holtwinters'],
+    'charts':      ['pandas', 'matplotlib.figure', 'matplotlib.backends.backend_agg'],
+    'gold':        ['yfinance'],
+    'firebase':    ['firebase_config'],
+    'recognition': ['numpy', 'PIL.Image', 'tensorflow'],
+}
+
+def configured_subsystems():
+    raw = os.getenv('PRELOAD_SUBSYSTEMS', '').strip()
+    if raw.lower() == 'all':
+        return list(SUBSYSTEMS)
+    return [name.strip().lower() for name in raw.split(',') if name.strip()]
+
+def load_subsystem(name):
+    for module in SUBSYSTEMS[name]:
+        importlib.import_module(module)
+    if name == 'recognition':
+        from services.currency_recognition import get_model
+        get_model()
+
+def preload(names=None):
+    """Import the given (default: configured) subsystems; returns {name: seconds}."""
+    timings = {}
+    for name in configured_subsystems() if names is None else names:
+        if name not in SUBSYSTEMS:
+            log.warning('Unknown preload subsystem %r (known: %s)', name, ', '.join(SUBSYSTEMS))
+            continue
+        start = time.perf_counter()
+        load_subsystem(name)
+        timings[name] = time.perf_counter() - start
+        log.info('Preloaded %s in %.2fs', name, timings[name])
+    return timings
@@ -0,0 +1,101 @@
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from model import db
+from model.transaction import Transaction, TransactionHourlyBucket
+
+# Optional hourly roll-up of transaction totals. When enabled, /exchangeRate
+# sums ~72 bucket rows instead of scanning every trade in the window.
+
+def buckets_enabled():
+    return os.getenv('EXCHANGE_RATE_BUCKETS', '0').lower() in ('1', 'true', 'yes')
+
+def hour_floor(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def record_transactions(items):
+    """
+    Add (usd_to_lbp, added_date, usd_amount, lbp_amount) tuples to their hourly buckets.
+
+    Increments are applied as `col = col + x` in SQL so concurrent writers
+    never overwrite each other; the caller commits together with the trades.
+    """
+    totals = defaultdict(lambda: [0.0, 0.0, 0])
+    for usd_to_lbp, added_date, usd, lbp in items:
+        t = totals[(bool(usd_to_lbp), hour_floor(added_date))]
+        t[0] += usd; t[1] += lbp; t[2] += 1
+
+    B = TransactionHourlyBucket
+    for (direction, start), (usd, lbp, n) in totals.items():
+        for _ in range(2):
+            updated = B.query.filter_by(usd_to_lbp=direction, bucket_start=start).update({
+                B.usd_total: B.usd_total + usd,
+                B.lbp_total: B.lbp_total + lbp,
+                B.txn_count: B.txn_count + n
+            }, synchronize_session=False)
+            if updated:
+                break
+            try:
+                with db.session.begin_nested():
+                    db.session.add(B(usd_to_lbp=direction, bucket_start=start,
+                                     usd_total=usd, lbp_total=lbp, txn_count=n))
+                break
+            except IntegrityError:
+                # another writer created the bucket first; increment it instead
+                continue
+
+def record_transaction(txn):
+    record_transactions([(txn.usd_to_lbp, txn.added_date, txn.usd_amount, txn.lbp_amount)])
+
+def window_totals(hours=72, usd_to_lbp=True):
+    """
+    (txn_count, usd_total, lbp_total) for the last `hours`.
+
+    Reads the hourly buckets when they are enabled (the oldest bucket is
+    taken whole, so the window can reach back up to one extra hour),
+    otherwise runs a single aggregate query over the indexed trades.
+    """
+    end = datetime.utcnow()
+    start = end - timedelta(hours=hours)
+    if buckets_enabled():
+        B = TransactionHourlyBucket
+        q = db.session.query(
+            func.coalesce(func.sum(B.txn_count), 0),
+            func.coalesce(func.sum(B.usd_total), 0.0),
+            func.coalesce(func.sum(B.lbp_total), 0.0)
+        ).filter(B.usd_to_lbp.is_(usd_to_lbp), B.bucket_start >= hour_floor(start))
+    else:
+        q = db.session.query(
+            func.count(Transaction.id),
+            func.coalesce(func.sum(Transaction.usd_amount), 0.0),
+            func.coalesce(func.sum(Transaction.lbp_amount), 0.0)
+        ).filter(
+            Transaction.usd_to_lbp.is_(usd_to_lbp),
+            Transaction.added_date.between(start, end)
+        )
+    count, usd, lbp = q.one()
+    return int(count), float(usd), float(lbp)
+
+def rebuild_buckets(chunk_size=10000):
+    """Recompute every bucket from the transaction table (backfill after enabling)."""
+    totals = defaultdict(lambda: [0.0, 0.0, 0])
+    rows = db.session.query(
+        Transaction.usd_to_lbp, Transaction.added_date,
+        Transaction.usd_amount, Transaction.lbp_amount
+    ).execution_options(yield_per=chunk_size)
+    for usd_to_lbp, added_date, usd, lbp in rows:
+        if added_date is None:
+            continue
+        t = totals[(bool(usd_to_lbp), hour_floor(added_date))]
+        t[0] += usd; t[1] += lbp; t[2] += 1
+
+    TransactionHourlyBucket.query.delete()
+    db.session.bulk_insert_mappings(TransactionHourlyBucket, [
+        {'usd_to_lbp': d, 'bucket_start': s, 'usd_total': u, 'lbp_total': l, 'txn_count': n}
+        for (d, s), (u, l, n) in totals.items()
+    ])
+    db.session.commit()
+    return len(totals)
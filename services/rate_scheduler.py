@@ -0,0 +1,65 @@
+import os
+import threading
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+
+from model import db
+from services.rate_store import ensure_history, refresh_recent
+
+log = logging.getLogger(__name__)
+
+# "BASE:TARGET" pairs kept warm in the local rate history store
+DEFAULT_PAIRS = 'USD:EUR,USD:GBP,USD:CAD,USD:JPY,EUR:USD'
+
+# Callables run with the ingested pairs after every ingestion pass
+ingest_hooks = []
+
+def configured_pairs():
+    raw = os.getenv('RATE_INGEST_PAIRS', DEFAULT_PAIRS)
+    pairs = []
+    for item in raw.split(','):
+        if ':' in item:
+            base, target = item.strip().upper().split(':', 1)
+            pairs.append((base, target))
+    return pairs
+
+def ingest_once(pairs=None, backfill_days=None):
+    """Backfill any missing history and re-pull the latest days, one upstream call per base."""
+    if backfill_days is None:
+        backfill_days = int(os.getenv('RATE_INGEST_BACKFILL_DAYS', 365))
+    pairs = pairs or configured_pairs()
+    by_base = defaultdict(list)
+    for base, target in pairs:
+        by_base[base].append(target)
+
+    end = date.today()
+    for base, targets in by_base.items():
+        try:
+            ensure_history(base, targets, end - timedelta(days=backfill_days), end)
+            refresh_recent(base, targets)
+        except Exception as e:
+            db.session.rollback()
+            log.warning('Rate ingestion failed for %s: %s', base, e)
+
+    for hook in ingest_hooks:
+        try:
+            hook(pairs)
+        except Exception as e:
+            log.warning('Ingest hook %s failed: %s', getattr(hook, '__name__', hook), e)
+    return by_base
+
+def start_rate_ingestion(app, interval=None):
+    """Run `ingest_once` in a daemon thread every `interval` seconds (RATE_INGEST_INTERVAL)."""
+    if interval is None:
+        interval = float(os.getenv('RATE_INGEST_INTERVAL', 3600))
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            with app.app_context():
+                ingest_once()
+            stop.wait(interval)
+
+    threading.Thread(target=loop, name='rate-ingestion', daemon=True).start()
+    return stop
@@ -0,0 +1,166 @@
+import os
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy.exc import IntegrityError
+
+from model import db
+from model.rate_history import RateHistory, RateCoverage
+from services.exchange_api import fetch_rate_range, rate_cache
+
+# Local daily rate history. Reads are served from the rate_history table and
+# only the days outside a pair's RateCoverage window go to Frankfurter.
+
+# ECB reference rates appear around 16:00 CET on TARGET business days; until
+# this hour (UTC) today's rate is not asked for
+PUBLISH_HOUR_UTC = int(os.getenv('ECB_PUBLISH_HOUR_UTC', 16))
+
+def last_business_day(now=None):
+    """Newest day Frankfurter can have a rate for: today after publish time, else the previous weekday."""
+    now = now or datetime.now(timezone.utc)
+    day = now.date()
+    if now.hour < PUBLISH_HOUR_UTC:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+def ensure_history(source, currencies, start, end):
+    """
+    Make sure every (source, currency) pair is stored for [start, end].
+
+    Missing edges of each pair's coverage window are merged into one date
+    range and fetched with a single Frankfurter call for all currencies
+    that need it. Returns the number of upstream fetches (0 or 1).
+
+    `end` is capped at `last_business_day()`, so weekends and today before
+    the ECB publish time never count as missing and a warm store makes no
+    call. Coverage only advances to the latest day Frankfurter actually
+    returned; a day still absent (e.g. a TARGET holiday) is asked for again
+    through the shared rate cache, at most once per RATE_CACHE_TTL.
+    """
+    end = min(end, last_business_day())
+    if start > end:
+        return 0
+    covs = {
+        c.currency: c for c in RateCoverage.query.filter(
+            RateCoverage.source == source,
+            RateCoverage.currency.in_(currencies)
+        )
+    }
+    need, gaps_all = [], []
+    for cur in currencies:
+        cov = covs.get(cur)
+        if cov is None:
+            gaps = [(start, end)]
+        else:
+            gaps = []
+            if start < cov.first_date:
+                gaps.append((start, cov.first_date - timedelta(days=1)))
+            if end > cov.last_date:
+                gaps.append((cov.last_date + timedelta(days=1), end))
+        if gaps:
+            need.append(cur)
+            gaps_all.extend(gaps)
+    if not need:
+        return 0
+
+    lo = min(g[0] for g in gaps_all)
+    hi = max(g[1] for g in gaps_all)
+
+    raw = rate_cache.get_or_load(('raw-range', source, tuple(need), (lo, hi)),
+                                 lambda: fetch_rate_range(source, need, lo, hi))
+    store_rates(source, need, lo, hi, raw)
+    for cur in need:
+        last = latest_date(raw, cur)
+        cov = covs.get(cur)
+        if cov is None:
+            db.session.add(RateCoverage(source=source, currency=cur, first_date=lo,
+                                        last_date=last or lo - timedelta(days=1)))
+        else:
+            cov.first_date = min(cov.first_date, lo)
+            if last is not None:
+                cov.last_date = max(cov.last_date, last)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # a concurrent request stored the same window first
+        db.session.rollback()
+    return 1
+
+def refresh_recent(source, currencies, days=3):
+    """Re-pull the last few days so a rate published after the last fetch replaces the gap."""
+    end   = date.today()
+    start = end - timedelta(days=days)
+    raw = fetch_rate_range(source, currencies, start, end)
+    store_rates(source, currencies, start, end, raw)
+    for cov in RateCoverage.query.filter(
+            RateCoverage.source == source,
+            RateCoverage.currency.in_(currencies)):
+        last = latest_date(raw, cov.currency)
+        if last is not None:
+            cov.last_date = max(cov.last_date, last)
+    db.session.commit()
+
+def latest_date(raw, currency):
+    """Latest day of a Frankfurter `{date: {currency: rate}}` payload that has `currency`, or None."""
+    days = [d for d, rates in raw.items() if currency in rates]
+    return datetime.strptime(max(days), '%Y-%m-%d').date() if days else None
+
+def store_rates(source, currencies, start, end, raw):
+    """Upsert a Frankfurter `{date: {currency: rate}}` payload (caller commits)."""
+    existing = {
+        (r.currency, r.date): r for r in RateHistory.query.filter(
+            RateHistory.source == source,
+            RateHistory.currency.in_(currencies),
+            RateHistory.date.between(start - timedelta(days=7), end)
+        )
+    }
+    for d, rates in raw.items():
+        day = datetime.strptime(d, '%Y-%m-%d').date()
+        for cur in currencies:
+            if cur not in rates:
+                continue
+            row = existing.get((cur, day))
+            if row is None:
+                db.session.add(RateHistory(source=source, currency=cur,
+                                           date=day, rate=rates[cur]))
+            else:
+                row.rate = rates[cur]
+
+def get_history_df(source='USD', currency='EUR', days=7):
+    """Same frame as exchange_api.get_historical_rates_df, read from the local store."""
+    return get_history_frames(source, [currency], days)[currency]
+
+def get_history_frames(source, currencies, days=7):
+    """{currency: date/rate frame} for several targets of one base, with at most one upstream call."""
+    import pandas as pd
+    end   = date.today()
+    start = end - timedelta(days=days)
+    ensure_history(source, currencies, start, end)
+    rows = db.session.query(RateHistory.currency, RateHistory.date, RateHistory.rate).filter(
+        RateHistory.source == source,
+        RateHistory.currency.in_(currencies),
+        RateHistory.date.between(start, end)
+    ).order_by(RateHistory.currency, RateHistory.date).all()
+    all_df = pd.DataFrame(rows, columns=['currency', 'date', 'rate'])
+    frames = {}
+    for cur in currencies:
+        df = all_df.loc[all_df['currency'] == cur, ['date', 'rate']].reset_index(drop=True)
+        if not df.empty:
+            df['date'] = pd.to_datetime(df['date'])
+        frames[cur] = df
+    return frames
+
+def get_history_rates(source='USD', currency='EUR', days=7):
+    """Same payload as exchange_api.get_historical_rates, read from the local store."""
+    end = date.today()
+    df  = get_history_df(source, currency, days)
+    return {
+        'source':     source,
+        'currency':   currency,
+        'start_date': str(end - timedelta(days=days)),
+        'end_date':   str(end),
+        'rates':      {
+            d.strftime('%Y-%m-%d'): {f'{source}{currency}': r}
+            for d, r in zip(df['date'], df['rate'])
+        }
+    }
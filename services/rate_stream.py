@@ -0,0 +1,158 @@
+import os
+import json
+import queue
+import logging
+import threading
+from datetime import datetime
+
+from model import db
+from services.dashboard import dashboard_rates, configured_extra_pairs
+from services.trigger_engine import evaluate_triggers
+
+log = logging.getLogger(__name__)
+
+QUEUE_SIZE      = int(os.getenv('SSE_QUEUE_SIZE', 32))
+MAX_SUBSCRIBERS = int(os.getenv('SSE_MAX_SUBSCRIBERS', 1000))
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscriber:
+    """One connected client: a bounded queue of pending events."""
+
+    def __init__(self, size=QUEUE_SIZE):
+        self.queue   = queue.Queue(maxsize=size)
+        self.dropped = False
+
+
+class RateBroadcaster:
+    """
+    One producer thread polls rates and gold (and triggers, with SSE_TRIGGERS)
+    and fans the changes out to every subscriber's queue. Fired triggers are
+    published by the trigger_engine alert hook, whoever ran the evaluation.
+
+    A subscriber whose queue is full is a slow consumer: it is dropped
+    rather than letting its backlog grow or holding up the others. New
+    subscribers first get a snapshot of the current state, then deltas.
+    The producer only polls while someone is listening.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.quotes      = {}
+        self.gold        = None
+        self.dropped     = 0
+        self._seq        = 0
+        self._lock       = threading.Lock()
+        self._wake       = threading.Event()
+        self._thread     = None
+
+    def subscribe(self, app):
+        sub = Subscriber()
+        with self._lock:
+            if len(self.subscribers) >= MAX_SUBSCRIBERS:
+                raise TooManySubscribers(f'At most {MAX_SUBSCRIBERS} stream subscribers')
+            self.subscribers.add(sub)
+            if self.quotes or self.gold is not None:
+                sub.queue.put_nowait(self._event('snapshot', {
+                    'quotes': dict(self.quotes), 'gold_price': self.gold
+                }))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(app,),
+                                                name='rate-stream', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self.subscribers.discard(sub)
+
+    def publish(self, event, data):
+        with self._lock:
+            message = self._event(event, data)
+            for sub in list(self.subscribers):
+                try:
+                    sub.queue.put_nowait(message)
+                except queue.Full:
+                    sub.dropped = True
+                    self.subscribers.discard(sub)
+                    self.dropped += 1
+
+    def stats(self):
+        with self._lock:
+            return {'subscribers': len(self.subscribers), 'dropped': self.dropped,
+                    'events': self._seq, 'pairs': len(self.quotes)}
+
+    def poll_once(self):
+        """Fetch once and publish what changed; returns the number of events sent."""
+        sent = 0
+        data = dashboard_rates(configured_extra_pairs())
+        quotes = dict(data.get('currency_rates') or {})
+        quotes.update({k: v for k, v in (data.get('extra_rates') or {}).items() if v is not None})
+        gold = (data.get('gold_price') or {}).get('price')
+
+        with self._lock:
+            delta = {k: v for k, v in quotes.items() if self.quotes.get(k) != v}
+            gold_changed = gold is not None and gold != self.gold
+            self.quotes.update(delta)
+            if gold_changed:
+                self.gold = gold
+        if delta or gold_changed:
+            payload = {'quotes': delta, 'partial': data.get('partial', [])}
+            if gold_changed:
+                payload['gold_price'] = gold
+            self.publish('rates', payload)
+            sent += 1
+
+        # opt-in: evaluating fires (and consumes) triggers; whatever fires is
+        # published through publish_alerts, as for /check-live-triggers
+        if os.getenv('SSE_TRIGGERS', '0').lower() in ('1', 'true', 'yes'):
+            if evaluate_triggers():
+                sent += 1
+        return sent
+
+    # -- internals --
+    def _event(self, event, data):
+        # caller holds self._lock
+        self._seq += 1
+        data = dict(data, timestamp=datetime.utcnow().isoformat())
+        return f'id: {self._seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n'
+
+    def _run(self, app):
+        interval = float(os.getenv('SSE_INTERVAL', 5))
+        while True:
+            with self._lock:
+                listening = bool(self.subscribers)
+            if not listening:
+                self._wake.wait()
+            self._wake.clear()
+            with app.app_context():
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    db.session.rollback()
+                    log.warning('Rate stream poll failed: %s', e)
+            self._wake.wait(interval)
+
+
+broadcaster = RateBroadcaster()
+
+def publish_alerts(alerts):
+    """trigger_engine alert hook: forward fired triggers to stream subscribers."""
+    broadcaster.publish('triggers', {'triggered_alerts': alerts})
+
+def event_stream(sub, keepalive=15):
+    """SSE text for one subscriber; ends when it is dropped or the client goes away."""
+    try:
+        yield 'retry: 5000\n\n'
+        while not sub.dropped:
+            try:
+                yield sub.queue.get(timeout=keepalive)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+        yield 'event: dropped\ndata: {"reason": "slow consumer"}\n\n'
+    finally:
+        broadcaster.unsubscribe(sub)
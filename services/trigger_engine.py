@@ -0,0 +1,85 @@
+import logging
+import operator
+
+from model import db
+from model.trigger import Trigger
+from services.exchange_api import get_live_rates
+from services.trigger_index import trigger_index
+
+log = logging.getLogger(__name__)
+
+# Callables run with the fired alerts after every evaluation that fired any,
+# whoever triggered it (POST /check-live-triggers or the rate stream producer)
+alert_hooks = []
+
+# Comparison table used instead of eval() on a formatted string
+OPERATORS = {
+    '>':  operator.gt,
+    '<':  operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq
+}
+
+def evaluate_triggers():
+    """
+    Fire every pending Trigger satisfied by the current live rates.
+
+    Pending triggers live in `trigger_index`, grouped by base currency so
+    each base costs a single Frankfurter call carrying all of its targets,
+    and sorted by threshold so only the triggers that actually fire are
+    touched. The candidates still pending are claimed with one
+    SELECT ... FOR UPDATE SKIP LOCKED and flipped with one UPDATE; only
+    claimed triggers are reported, so concurrent evaluations never report
+    the same trigger twice.
+    Returns the list of fired alerts.
+    """
+    trigger_index.sync()
+
+    alerts = []
+    for base, targets in trigger_index.targets_by_base().items():
+        try:
+            quotes = get_live_rates(source=base, currencies=sorted(targets))['quotes']
+        except Exception:
+            continue
+        for target in targets:
+            rate = quotes.get(base + target)
+            if rate is None:
+                continue
+            for op, threshold, tid in trigger_index.fire(base, target, rate):
+                alerts.append({
+                    'id': tid,
+                    'base_currency': base,
+                    'target_currency': target,
+                    'operator': op,
+                    'threshold': threshold,
+                    'live_rate': rate
+                })
+
+    if alerts:
+        try:
+            # lock the still-pending rows (skipping any another evaluation
+            # holds), then flip them in one UPDATE
+            claimed = {tid for (tid,) in db.session.query(Trigger.id).filter(
+                Trigger.id.in_([a['id'] for a in alerts]),
+                Trigger.triggered.is_(False)
+            ).with_for_update(skip_locked=True)}
+            if claimed:
+                Trigger.query.filter(Trigger.id.in_(claimed)) \
+                    .update({'triggered': True}, synchronize_session=False)
+            db.session.commit()
+            alerts = [a for a in alerts if a['id'] in claimed]
+        except Exception:
+            # the fired entries are already out of the index; rebuild it
+            # from the DB so nothing is lost, and surface the failure
+            db.session.rollback()
+            trigger_index.reset()
+            raise
+
+    if alerts:
+        for hook in alert_hooks:
+            try:
+                hook(alerts)
+            except Exception as e:
+                log.warning('Alert hook %s failed: %s', getattr(hook, '__name__', hook), e)
+    return alerts
@@ -0,0 +1,123 @@
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from model.trigger import Trigger
+
+_INF = float('inf')
+
+
+class PairIndex:
+    """
+    Pending thresholds of one currency pair, kept sorted per operator.
+
+    Each list holds (threshold, trigger_id) tuples in ascending order, so the
+    triggers satisfied by a rate always form a prefix ('>' / '>=') or a suffix
+    ('<' / '<=') that a single bisect locates. Fired entries are removed,
+    which keeps a tick at O(log n + fired).
+    """
+
+    def __init__(self):
+        self.sorted = {op: [] for op in ('>', '>=', '<', '<=')}
+        self.equal  = defaultdict(list)    # threshold -> [trigger_id]
+        self.count  = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, op, threshold, trigger_id):
+        self.count += 1
+        if op == '==':
+            self.equal[threshold].append(trigger_id)
+        else:
+            insort(self.sorted[op], (threshold, trigger_id))
+
+    def fire(self, rate):
+        """Remove and return (operator, threshold, trigger_id) for every trigger `rate` satisfies."""
+        fired = []
+
+        # threshold < rate / threshold <= rate -> leading slice
+        for op, probe in (('>', (rate,)), ('>=', (rate, _INF))):
+            entries = self.sorted[op]
+            i = bisect_left(entries, probe)
+            fired.extend((op, th, tid) for th, tid in entries[:i])
+            del entries[:i]
+
+        # threshold > rate / threshold >= rate -> trailing slice
+        for op, probe in (('<', (rate, _INF)), ('<=', (rate,))):
+            entries = self.sorted[op]
+            i = bisect_left(entries, probe)
+            fired.extend((op, th, tid) for th, tid in entries[i:])
+            del entries[i:]
+
+        for tid in self.equal.pop(rate, []):
+            fired.append(('==', rate, tid))
+        self.count -= len(fired)
+        return fired
+
+
+class TriggerIndex:
+    """
+    In-process index of untriggered Trigger rows, one PairIndex per
+    (base_currency, target_currency).
+
+    `add()` indexes a trigger created by this process straight away, and
+    `sync()` pulls rows created since the last load (by id high-water mark)
+    so triggers created by other workers are picked up as well.
+    """
+
+    def __init__(self):
+        self._pairs   = {}
+        self._known   = set()     # ids currently indexed
+        self._last_id = 0
+        self._lock    = threading.Lock()
+
+    def add(self, trigger):
+        with self._lock:
+            self._add(trigger)
+
+    def sync(self):
+        rows = Trigger.query.filter(
+            Trigger.triggered.is_(False),
+            Trigger.id > self._last_id
+        ).order_by(Trigger.id).all()
+        with self._lock:
+            for t in rows:
+                self._add(t)
+                self._last_id = max(self._last_id, t.id)
+        return len(rows)
+
+    def reset(self):
+        with self._lock:
+            self._pairs.clear()
+            self._known.clear()
+            self._last_id = 0
+
+    def targets_by_base(self):
+        with self._lock:
+            out = defaultdict(list)
+            for (base, target), pair in self._pairs.items():
+                if len(pair):
+                    out[base].append(target)
+            return dict(out)
+
+    def fire(self, base, target, rate):
+        with self._lock:
+            pair = self._pairs.get((base, target))
+            if pair is None:
+                return []
+            fired = pair.fire(rate)
+            self._known.difference_update(tid for _, _, tid in fired)
+            return fired
+
+    def _add(self, t):
+        if t.id in self._known:
+            return
+        key = (t.base_currency, t.target_currency)
+        if key not in self._pairs:
+            self._pairs[key] = PairIndex()
+        self._pairs[key].add(t.operator, t.threshold, t.id)
+        self._known.add(t.id)
+
+
+trigger_index = TriggerIndex()
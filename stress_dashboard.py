@@ -0,0 +1,53 @@
+# stress_dashboard.py
+#
+# Isolation check for /api/dashboard-rates: Frankfurter is made to hang on
+# every call while gold answers at once, then the dashboard is loaded many
+# more times than there are worker threads. Every load must still return
+# the gold price and report only the rates as partial.
+#
+#   python stress_dashboard.py [page_views]
+#
+# No network or database: the upstream calls are replaced in-process.
+
+import os
+import sys
+import threading
+
+os.environ.setdefault('DASHBOARD_RATES_TIMEOUT', '0.2')
+os.environ.setdefault('DASHBOARD_GOLD_TIMEOUT', '0.2')
+
+import services.dashboard as dashboard
+
+def run(page_views=40):
+    stall = threading.Event()
+
+    def stalled_rates(*args, **kwargs):
+        stall.wait()                      # never answers while the check runs
+        raise RuntimeError('released')
+
+    def instant_gold():
+        return {'symbol': 'GC=F', 'currency': 'USD', 'price': 2000.0}
+
+    dashboard.get_live_rates = stalled_rates
+    dashboard.get_gold_price = instant_gold
+
+    failures = []
+    try:
+        for n in range(page_views):
+            data = dashboard.dashboard_rates([('EUR', 'USD')])
+            if data['gold_price'] is None or 'gold_price' in data['partial']:
+                failures.append((n, data['errors']))
+    finally:
+        stall.set()
+
+    print(f"{page_views} page views with a stalled Frankfurter "
+          f"({os.getenv('DASHBOARD_WORKERS', 8)} threads per upstream): "
+          f"{page_views - len(failures)} served gold")
+    if failures:
+        print(f"FAILED: first gold failure at view {failures[0][0]}: {failures[0][1]}")
+    else:
+        print("OK: a stalled source did not affect the others")
+    return not failures
+
+if __name__ == '__main__':
+    sys.exit(0 if run(*[int(a) for a in sys.argv[1:2]]) else 1)
@@ -0,0 +1,92 @@
+# stress_ledger.py
+#
+# Concurrency stress test for the wallet ledger: many threads credit and
+# debit the same wallet at once, then the final balance is checked against
+# both the committed operations and the sum of the ledger entries.
+#
+#   STRESS_DB_URI=mysql+pymysql://... python stress_ledger.py [threads] [ops]
+#
+# Defaults to the app's DB_CONFIG. Tables are created if missing and the
+# rows written for the stress user are removed afterwards.
+
+import os
+import sys
+import threading
+import uuid
+from decimal import Decimal
+
+from flask import Flask
+from sqlalchemy import func
+
+from db_config import DB_CONFIG
+from model import db
+from model.user import User
+from model.wallet import WalletBalance
+from model.ledger import LedgerEntry
+from services.ledger import credit, debit, to_amount, InsufficientFunds
+
+CREDIT = Decimal('1.00')
+DEBIT  = Decimal('0.75')
+
+def run(threads=32, ops=200):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('STRESS_DB_URI', DB_CONFIG)
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 60}}
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        user = User(firebase_uid=f'stress-{uuid.uuid4().hex}')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    done = {'credits': 0, 'debits': 0, 'rejected': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def worker(n):
+        with app.app_context():
+            for i in range(ops):
+                kind = 'debits' if (n + i) % 3 == 0 else 'credits'
+                try:
+                    if kind == 'credits':
+                        credit(user_id, 'USD', CREDIT, 'DEPOSIT')
+                    else:
+                        debit(user_id, 'USD', DEBIT, 'ESCROW_HOLD')
+                    db.session.commit()
+                except InsufficientFunds:
+                    db.session.rollback()
+                    kind = 'rejected'
+                except Exception:
+                    db.session.rollback()
+                    kind = 'errors'
+                with lock:
+                    done[kind] += 1
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+    with app.app_context():
+        balance = to_amount(WalletBalance.query.filter_by(user_id=user_id, currency='USD').one().balance)
+        ledger  = to_amount(db.session.query(func.sum(LedgerEntry.amount))
+                            .filter_by(user_id=user_id, currency='USD').scalar() or 0)
+        expected = to_amount(done['credits'] * CREDIT - done['debits'] * DEBIT)
+
+        LedgerEntry.query.filter_by(user_id=user_id).delete()
+        WalletBalance.query.filter_by(user_id=user_id).delete()
+        User.query.filter_by(id=user_id).delete()
+        db.session.commit()
+
+    print(f"{threads} threads x {ops} ops: {done}")
+    print(f"balance={balance} ledger_sum={ledger} expected={expected}")
+    ok = balance == ledger == expected and balance >= 0
+    print("OK: no lost updates" if ok else "FAILED: balance drifted")
+    return ok
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(0 if run(*args) else 1)
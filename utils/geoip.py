@@ -0,0 +1,133 @@
+# utils/geoip.py
+
+import csv
+import mmap
+import os
+import struct
+import ipaddress
+import threading
+from bisect import bisect_right
+from functools import lru_cache
+
+# Offline IP -> country lookup.
+#
+# The database is a binary file built once from a range CSV (e.g. the free
+# DB-IP "IP to Country Lite" file: start_ip,end_ip,country) and memory-mapped
+# at runtime, so workers share the pages and nothing is parsed at startup.
+#
+# Layout: header (magic, IPv4 count, IPv6 count), then for each family the
+# sorted range starts, the range ends (both big-endian, 4 or 16 bytes) and
+# the 2-letter country codes. Big-endian keys compare as bytes in numeric
+# order, so bisect works directly on slices of the mapping.
+
+MAGIC  = b'GEOIPDB1'
+HEADER = struct.Struct('<8sII')
+
+DB_PATH = os.getenv('GEOIP_DB_PATH', 'data/geoip.bin')
+
+
+class _Keys:
+    """Read-only sequence view of fixed-width keys inside the mapping (for bisect)."""
+
+    def __init__(self, buf, offset, width, count):
+        self.buf, self.offset, self.width, self.count = buf, offset, width, count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = self.offset + i * self.width
+        return self.buf[start:start + self.width]
+
+
+class _Section:
+    def __init__(self, buf, offset, width, count):
+        self.starts    = _Keys(buf, offset, width, count)
+        self.ends      = _Keys(buf, offset + count * width, width, count)
+        self.countries = _Keys(buf, offset + 2 * count * width, 2, count)
+        self.size      = count * (2 * width + 2)
+
+    def find(self, key):
+        i = bisect_right(self.starts, key) - 1
+        if i < 0 or self.ends[i] < key:
+            return None
+        return self.countries[i].decode('ascii')
+
+
+class GeoIPDatabase:
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._buf  = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n4, n6 = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a GeoIP database')
+        self.v4 = _Section(self._buf, HEADER.size, 4, n4)
+        self.v6 = _Section(self._buf, HEADER.size + self.v4.size, 16, n6)
+
+    def lookup(self, ip):
+        """Country code for `ip`, or None when it is malformed or in no range."""
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if addr.version == 6 and addr.ipv4_mapped is not None:
+            addr = addr.ipv4_mapped
+        country = (self.v4 if addr.version == 4 else self.v6).find(addr.packed)
+        return None if country in (None, 'ZZ', '--') else country
+
+    def close(self):
+        self._buf.close()
+        self._file.close()
+
+
+def build_database(csv_path, out_path=DB_PATH):
+    """Convert a start_ip,end_ip,country CSV into the binary format; returns the range count."""
+    ranges = {4: [], 6: []}
+    with open(csv_path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+            try:
+                start, end = _parse_ip(row[0]), _parse_ip(row[1])
+            except ValueError:
+                continue                      # header or comment line
+            country = row[2].strip().upper()[:2].ljust(2, '-')
+            ranges[start.version].append((start.packed, end.packed, country.encode('ascii')))
+
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, len(ranges[4]), len(ranges[6])))
+        for version in (4, 6):
+            rows = sorted(ranges[version])
+            out.write(b''.join(r[0] for r in rows))
+            out.write(b''.join(r[1] for r in rows))
+            out.write(b''.join(r[2] for r in rows))
+    os.replace(tmp_path, out_path)
+    return len(ranges[4]) + len(ranges[6])
+
+def _parse_ip(value):
+    value = value.strip()
+    # IP2Location-style CSVs store IPv4 ranges as integers
+    return ipaddress.ip_address(int(value) if value.isdigit() else value)
+
+
+_db = None
+_db_lock = threading.Lock()
+_db_checked = False
+
+def get_database():
+    """The memory-mapped database at GEOIP_DB_PATH, or None when no file has been built."""
+    global _db, _db_checked
+    with _db_lock:
+        if not _db_checked:
+            _db_checked = True
+            if os.path.exists(DB_PATH):
+                _db = GeoIPDatabase(DB_PATH)
+        return _db
+
+@lru_cache(maxsize=int(os.getenv('GEOIP_CACHE_SIZE', 65536)))
+def lookup_country(ip):
+    """Country code for `ip` from the local database (hot IPs answered from an LRU)."""
+    db = get_database()
+    return db.lookup(ip) if db is not None else None
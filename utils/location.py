@@ -1,11 +1,25 @@
 # utils/location.py
 
-import requests
+import ipaddress
+
+from services import http_client
+from utils.geoip import get_database, lookup_country
+
+# Step 0: The client IP (first hop of X-Forwarded-For when behind a proxy)
+def client_ip(forwarded_for, remote_addr):
+    first = (forwarded_for or '').split(',')[0].strip()
+    try:
+        return str(ipaddress.ip_address(first))
+    except ValueError:
+        return remote_addr
 
 # Step 1: Get the country from IP address
 def get_country_from_ip(ip_address):
+    # Offline database when one has been built (flask build-geoip), ipinfo.io otherwise
+    if get_database() is not None:
+        return lookup_country(ip_address) or "US"
     try:
-        response = requests.get(f"https://ipinfo.io/{ip_address}/json")
+        response = http_client.get(f"https://ipinfo.io/{ip_address}/json")
         if response.status_code == 200:
             return response.json().get("country", "US")
         return "US"
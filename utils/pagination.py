@@ -0,0 +1,44 @@
+# utils/pagination.py
+
+import base64
+import json
+from sqlalchemy import and_, or_
+
+# Keyset (cursor) pagination helpers: a cursor is the sort key of the last
+# row of a page, so the next page is a range scan on an index rather than
+# an OFFSET that re-reads every earlier row.
+
+def encode_cursor(*values):
+    raw = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Return the list of key values stored in `cursor`; raises ValueError when it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+def keyset_after(columns, values, descending=False):
+    """
+    Filter for rows strictly after `values` in (col1, col2, ...) order,
+    written as nested OR/AND so it works on every backend. `descending` is
+    one flag for all columns or one per column (e.g. price desc, id asc).
+    """
+    if isinstance(descending, bool):
+        descending = [descending] * len(columns)
+    clauses = []
+    for i, col in enumerate(columns):
+        past = col < values[i] if descending[i] else col > values[i]
+        clauses.append(and_(*[columns[j] == values[j] for j in range(i)], past))
+    return or_(*clauses)
+
+def page_limit(raw, default=50, maximum=500):
+    try:
+        limit = int(raw) if raw is not None else default
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, maximum))